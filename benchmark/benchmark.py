@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026  Alex Schroeder <alex@gnu.org>
+
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+# Run mastodon-archive from this working directory against the fake
+# Mastodon instance in fake_mastodon.py, once for every size, and report
+# the requests, the wall time and the peak memory of every command:
+#
+# python3 benchmark/benchmark.py --sizes 1k,100k
+#
+# For every size, a new instance is started and a new directory is
+# created with the secrets for the account bench@bench.example. Then
+# these commands run one after another:
+#
+# archive:  the first archive, with mentions and following
+# update:   the same again, fetching nothing new
+# replies:  fetch the statuses replied to
+# expire:   delete the oldest statuses (about 2% of them)
+# mutuals:  list the people following you back
+#
+# The peak memory is the maximum resident set size of the process.
+
+import argparse
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import fake_mastodon
+
+USER = "bench@bench.example"
+
+COMMANDS = ["archive", "update", "replies", "expire", "mutuals"]
+
+# the working directory, not the installed package
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def size(text):
+    """
+    Parse a number like 1000, 100k or 1M.
+    """
+    factors = {"k": 10**3, "m": 10**6}
+    text = text.strip().lower()
+    if text[-1:] in factors:
+        return int(float(text[:-1]) * factors[text[-1]])
+    return int(text)
+
+def arguments(command, args):
+    """
+    Return the command line arguments for a command.
+    """
+    options = shlex.split(args.options)
+    if command in ("archive", "update"):
+        result = ["archive", "--with-mentions", "--with-following"]
+        result += shlex.split(args.archive_options)
+        if args.use_async:
+            result.append("--async")
+    elif command == "replies":
+        result = ["replies"]
+        if args.use_async:
+            result.append("--async")
+    elif command == "expire":
+        result = ["expire", "--older-than", str(args.older_than), "--confirmed"]
+    else:
+        result = [command]
+    return options + result + [USER]
+
+def run(command, args, directory, instance):
+    """
+    Run a command in the directory and return the result.
+    """
+    before = instance.summary()
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [ROOT] + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else []))
+    with tempfile.TemporaryFile() as errors:
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "-c", "import mastodon_archive; mastodon_archive.main()"]
+            + arguments(command, args),
+            cwd=directory, env=env, stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL, stderr=errors)
+        # wait4 has the resource usage of this process alone
+        pid, status, usage = os.wait4(process.pid, 0)
+        seconds = time.perf_counter() - start
+        process.returncode = os.waitstatus_to_exitcode(status)
+        errors.seek(0)
+        error = errors.read().decode("utf-8", "replace")
+    after = instance.summary()
+    endpoints = {key: value - before["endpoints"].get(key, 0)
+                 for key, value in after["endpoints"].items()
+                 if value != before["endpoints"].get(key, 0)}
+    return {"command": command,
+            "requests": after["requests"] - before["requests"],
+            "refused": after["refused"] - before["refused"],
+            "seconds": round(seconds, 3),
+            # kilobytes on Linux
+            "peak_mib": round(usage.ru_maxrss / 1024, 1),
+            "exit": process.returncode,
+            "endpoints": endpoints,
+            "error": error if process.returncode else ""}
+
+def benchmark(statuses, args):
+    """
+    Run the commands against a new instance with this many statuses
+    and return the results.
+    """
+    instance = fake_mastodon.Instance(statuses, latency=args.latency,
+                                      limit=args.rate_limit, window=args.window)
+    server = fake_mastodon.start(instance)
+    directory = tempfile.mkdtemp(prefix="mastodon-archive-benchmark-")
+    try:
+        username, domain = USER.split("@")
+        with open(os.path.join(directory, domain + ".client.secret"), "w") as fp:
+            print("bench-client-id", "bench-client-secret", server.url,
+                  sep="\n", file=fp)
+        with open(os.path.join(directory, domain + ".user." + username
+                               + ".secret"), "w") as fp:
+            print("bench-access-token", server.url, sep="\n", file=fp)
+        results = []
+        for command in args.commands.split(","):
+            result = run(command, args, directory, instance)
+            result["statuses"] = statuses
+            results.append(result)
+            report(result)
+            if result["exit"] != 0:
+                print(result["error"].rstrip(), file=sys.stderr)
+                break
+        return results
+    finally:
+        server.shutdown()
+        server.server_close()
+        if args.keep:
+            print("Kept", directory)
+        else:
+            shutil.rmtree(directory)
+
+def report(result):
+    print("%10d  %-8s %9d %8d %10.1f %9.1f %5d" % (
+        result["statuses"], result["command"], result["requests"],
+        result["refused"], result["seconds"], result["peak_mib"],
+        result["exit"]))
+    sys.stdout.flush()
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="""Benchmark mastodon-archive against a fake
+        Mastodon instance.""")
+    parser.add_argument("--sizes", default="1k,100k,1M",
+                        help='the numbers of statuses to benchmark, '
+                        'separated by commas (default 1k,100k,1M)')
+    parser.add_argument("--commands", default=",".join(COMMANDS),
+                        help='the commands to run, separated by commas '
+                        '(default %s)' % ",".join(COMMANDS))
+    parser.add_argument("--latency", type=float, default=0,
+                        help='the seconds every request takes (default 0)')
+    parser.add_argument("--rate-limit", type=int, default=100000,
+                        help='the requests allowed per window (default '
+                        '100000; Mastodon allows 300)')
+    parser.add_argument("--window", type=float, default=300,
+                        help='the seconds until the rate limit resets '
+                        '(default 300)')
+    parser.add_argument("--older-than", type=float,
+                        default=fake_mastodon.WEEKS - 5,
+                        help='the weeks for the expire command (default %d)'
+                        % (fake_mastodon.WEEKS - 5))
+    parser.add_argument("--async", dest='use_async', action='store_true',
+                        default=False, help='use the asyncio engine for '
+                        'archive, update and replies')
+    parser.add_argument("--options", default="",
+                        help='options for every command, e.g. "--cache"')
+    parser.add_argument("--archive-options", default="",
+                        help='more options for archive and update, '
+                        'e.g. "--connections 1"')
+    parser.add_argument("--json", metavar='FILE',
+                        help='also write the results to this file')
+    parser.add_argument("--keep", action='store_true', default=False,
+                        help='keep the directories with the archives')
+    args = parser.parse_args()
+
+    print("  statuses  command   requests  refused    seconds  peak MiB  exit")
+    results = []
+    for statuses in args.sizes.split(","):
+        results.extend(benchmark(size(statuses), args))
+    if args.json:
+        with open(args.json, "w") as fp:
+            json.dump(results, fp, indent=2)
+    if any(result["exit"] != 0 for result in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
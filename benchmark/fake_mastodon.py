@@ -0,0 +1,535 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026  Alex Schroeder <alex@gnu.org>
+
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+# A stand-in for a Mastodon instance with a single user and as many
+# statuses, favourites, bookmarks, notifications, followers and follows
+# as you like. Nothing is stored: every item is made up from its id when
+# it is requested, so a million statuses cost no memory. Only what you
+# delete, unfavour or dismiss is remembered.
+#
+# The server implements the endpoints mastodon-archive uses, the way
+# Mastodon does it: pages have a maximum size, Link headers point to the
+# next and the previous page, and every response has the X-RateLimit
+# headers. Once the requests of a window are used up, the server answers
+# with "429 Too Many Requests" until the window resets. Every request
+# can be delayed to make it look like the instance is far away.
+#
+# The user's statuses have the ids 1 to the number of statuses, newest
+# last. Every fifth status is a reply to a status of somebody else and
+# every tenth is a boost. Of the statuses replied to, every seventh is
+# gone ("404 Not Found"). The statuses are spread over the last five
+# years. A quarter of the notifications are mentions. Half the people
+# you follow follow you back.
+#
+# GET /_stats returns the number of requests per endpoint, the number
+# of requests refused and the number of requests in total.
+#
+# Use it on its own like this and register the app with the URL printed:
+#
+# python3 benchmark/fake_mastodon.py --statuses 100000 --latency 0.1
+
+import argparse
+import collections
+import datetime
+import json
+import re
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# the statuses are spread over this many weeks before the server started
+WEEKS = 260
+
+# where the ids of the statuses by other people start
+REPLIED = 10**9
+FAVOURITED = 2 * 10**9
+BOOKMARKED = 3 * 10**9
+MENTIONING = 4 * 10**9
+
+# where the ids of other accounts start
+FOLLOWER = 10**6
+FOLLOWED = 2 * 10**6
+
+# the maximum number of items per page, as in Mastodon
+PAGE_SIZES = {"statuses": 40, "favourites": 40, "bookmarks": 40,
+              "notifications": 80, "accounts": 80}
+
+NOTIFICATION_TYPES = ["mention", "favourite", "reblog", "follow"]
+
+class Instance:
+    """
+    The made up data, what was changed, and the rate limit.
+    """
+
+    def __init__(self, statuses=1000, favourites=None, bookmarks=None,
+                 notifications=None, followers=200, following=200,
+                 latency=0, limit=300, window=300):
+        self.counts = {
+            "statuses": statuses,
+            "favourites": statuses // 10 if favourites is None else favourites,
+            "bookmarks": statuses // 20 if bookmarks is None else bookmarks,
+            "notifications": statuses // 5 if notifications is None else notifications,
+            "followers": followers,
+            "following": following,
+        }
+        self.latency = latency
+        self.limit = limit
+        self.window = window
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.deleted = set()
+        self.unfavourited = set()
+        self.dismissed = set()
+        self.stats = collections.Counter()
+        self.refused = 0
+        self.reset = self.started + window
+        self.remaining = limit
+
+    def created_at(self, n, count):
+        """
+        Return the date of item n of count, the last one being the newest.
+        """
+        seconds = (count - n) * WEEKS * 7 * 24 * 60 * 60 / max(count, 1)
+        return timestamp(self.started - seconds)
+
+    def throttle(self):
+        """
+        Count a request against the rate limit and return whether it
+        may go ahead, and the headers to send.
+        """
+        with self.lock:
+            now = time.time()
+            if now >= self.reset:
+                self.reset = now + self.window
+                self.remaining = self.limit
+            allowed = self.remaining > 0
+            if allowed:
+                self.remaining -= 1
+            else:
+                self.refused += 1
+            headers = {"X-RateLimit-Limit": str(self.limit),
+                       "X-RateLimit-Remaining": str(self.remaining),
+                       "X-RateLimit-Reset": timestamp(self.reset)}
+            return allowed, headers
+
+    def count(self, method, path):
+        # one key per endpoint, not per id
+        endpoint = method + " " + re.sub(r"/\d+", "/:id", path)
+        with self.lock:
+            self.stats[endpoint] += 1
+
+    def summary(self):
+        with self.lock:
+            return {"requests": sum(self.stats.values()),
+                    "refused": self.refused,
+                    "endpoints": dict(self.stats)}
+
+    # The items
+
+    def account(self, id):
+        if id == 1:
+            username = "bench"
+        else:
+            username = "user%d" % id
+        return {"id": str(id), "username": username, "acct": username,
+                "display_name": username.capitalize(), "locked": False,
+                "bot": False, "created_at": timestamp(self.started - 10**8),
+                "note": "<p>A made up account.</p>",
+                "url": "https://bench.example/@" + username,
+                "avatar": "https://bench.example/avatars/original/missing.png",
+                "header": "https://bench.example/headers/original/missing.png",
+                "followers_count": self.counts["followers"],
+                "following_count": self.counts["following"],
+                "statuses_count": self.counts["statuses"],
+                "emojis": [], "fields": []}
+
+    def status(self, id, account=None, created_at=None, **kwargs):
+        if account is None:
+            account = 1 + id % 997 if id > self.counts["statuses"] else 1
+        if created_at is None:
+            created_at = self.created_at(id % REPLIED, self.counts["statuses"])
+        status = {
+            "id": str(id), "created_at": created_at,
+            "in_reply_to_id": None, "in_reply_to_account_id": None,
+            "sensitive": False, "spoiler_text": "", "visibility": "public",
+            "language": "en",
+            "uri": "https://bench.example/users/user/statuses/%d" % id,
+            "url": "https://bench.example/@user/%d" % id,
+            "replies_count": 0, "reblogs_count": id % 5,
+            "favourites_count": id % 11, "edited_at": None,
+            "favourited": False, "reblogged": False, "muted": False,
+            "bookmarked": False, "pinned": False,
+            "content": "<p>Status number %d, with a few words to make it "
+            "about as long as a typical toot. Lorem ipsum dolor sit amet, "
+            "consectetur adipiscing elit.</p>" % id,
+            "filtered": [], "reblog": None,
+            "application": {"name": "Web", "website": None},
+            "account": self.account(account), "media_attachments": [],
+            "mentions": [], "tags": [], "emojis": [], "card": None,
+            "poll": None}
+        status.update(kwargs)
+        return status
+
+    def own_status(self, n):
+        """
+        Return status n of the user, a reply or a boost every now and then.
+        """
+        status = self.status(n)
+        if n % 5 == 0:
+            status["in_reply_to_id"] = str(REPLIED + n)
+            status["in_reply_to_account_id"] = str(1 + n % 997)
+        elif n % 10 == 5:
+            status["reblog"] = self.status(REPLIED + n)
+        return status
+
+    def favourite(self, n):
+        return self.status(FAVOURITED + n, favourited=True, created_at=
+                           self.created_at(n, self.counts["favourites"]))
+
+    def bookmark(self, n):
+        return self.status(BOOKMARKED + n, bookmarked=True, created_at=
+                           self.created_at(n, self.counts["bookmarks"]))
+
+    def notification(self, n):
+        type = NOTIFICATION_TYPES[n % len(NOTIFICATION_TYPES)]
+        created_at = self.created_at(n, self.counts["notifications"])
+        notification = {"id": str(n), "type": type, "created_at": created_at,
+                        "account": self.account(1 + n % 997)}
+        if type == "mention":
+            notification["status"] = self.status(
+                MENTIONING + n, created_at=created_at,
+                mentions=[{"id": "1", "username": "bench", "acct": "bench",
+                           "url": "https://bench.example/@bench"}])
+        elif type in ("favourite", "reblog"):
+            notification["status"] = self.own_status(
+                1 + n % max(self.counts["statuses"], 1))
+        return notification
+
+    def relationship(self, id):
+        return {"id": str(id), "following": True,
+                "followed_by": id % 2 == 0, "blocking": False,
+                "blocked_by": False, "muting": False,
+                "muting_notifications": False, "requested": False,
+                "domain_blocking": False, "showing_reblogs": True,
+                "endorsed": False, "notifying": False, "note": ""}
+
+    def lookup(self, id):
+        """
+        Return the status with the id, or None if there is no such status.
+        """
+        if id in self.deleted:
+            return None
+        if 1 <= id <= self.counts["statuses"]:
+            return self.own_status(id)
+        if REPLIED < id < FAVOURITED and id % 7 != 0:
+            return self.status(id)
+        if FAVOURITED < id <= FAVOURITED + self.counts["favourites"]:
+            return self.favourite(id - FAVOURITED)
+        if BOOKMARKED < id <= BOOKMARKED + self.counts["bookmarks"]:
+            return self.bookmark(id - BOOKMARKED)
+        return None
+
+def timestamp(seconds):
+    return datetime.datetime.fromtimestamp(
+        seconds, datetime.timezone.utc).isoformat(timespec="milliseconds")[:-6] + "Z"
+
+def select(count, query, page_size, keep=lambda n: True):
+    """
+    Return the numbers of the items on a page, newest first. The items
+    are numbered from 1 to count, newest last. The query has max_id,
+    since_id, min_id and limit, as in Mastodon.
+    """
+    def number(key, default):
+        try:
+            return int(query[key][0])
+        except (KeyError, ValueError):
+            return default
+    limit = max(1, min(number("limit", 20), page_size))
+    numbers = []
+    if "min_id" in query:
+        n = number("min_id", 0) + 1
+        while n <= count and len(numbers) < limit:
+            if keep(n):
+                numbers.append(n)
+            n += 1
+        numbers.reverse()
+    else:
+        n = min(count, number("max_id", count + 1) - 1)
+        lowest = number("since_id", 0) + 1
+        while n >= lowest and len(numbers) < limit:
+            if keep(n):
+                numbers.append(n)
+            n -= 1
+    return numbers
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    Answer the requests of mastodon-archive.
+    """
+    # keep connections open like a real web server
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately
+    disable_nagle_algorithm = True
+    server_version = "FakeMastodon/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+    def do_DELETE(self):
+        self.handle_request("DELETE")
+
+    def handle_request(self, method):
+        instance = self.server.instance
+        url = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        # the request body is not used but has to be read
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        if url.path == "/_stats":
+            self.reply(200, instance.summary())
+            return
+        instance.count(method, url.path)
+        if instance.latency:
+            time.sleep(instance.latency)
+        allowed, headers = instance.throttle()
+        if not allowed:
+            self.reply(429, {"error": "Too many requests"}, headers)
+            return
+        for pattern, name in ROUTES[method]:
+            m = re.fullmatch(pattern, url.path)
+            if m:
+                status, data, links = getattr(self, name)(query, *m.groups())
+                if links:
+                    headers["Link"] = self.link(url.path, query, links)
+                self.reply(status, data, headers)
+                return
+        self.reply(404, {"error": "Record not found"}, headers)
+
+    def reply(self, status, data, headers={}):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def link(self, path, query, links):
+        """
+        Return the Link header for the next and previous page, keeping
+        the other parameters of the query.
+        """
+        base = "http://%s%s" % (self.headers.get("Host"), path)
+        params = [(key, value) for key, values in query.items()
+                  if key not in ("max_id", "min_id", "since_id")
+                  for value in values]
+        parts = []
+        for rel, key, value in links:
+            url = base + "?" + urllib.parse.urlencode(params + [(key, value)])
+            parts.append('<%s>; rel="%s"' % (url, rel))
+        return ", ".join(parts)
+
+    def page(self, query, count, page_size, item, keep=lambda n: True):
+        numbers = select(count, query, page_size, keep)
+        if not numbers:
+            return 200, [], []
+        return 200, [item(n) for n in numbers], [
+            ("next", "max_id", numbers[-1]), ("prev", "min_id", numbers[0])]
+
+    # The endpoints
+
+    def instance(self, query):
+        return 200, {"uri": "bench.example", "title": "Benchmark",
+                     "version": "4.2.0", "urls": {}}, []
+
+    def verify_credentials(self, query):
+        return 200, self.server.instance.account(1), []
+
+    def account(self, query, id):
+        return 200, self.server.instance.account(int(id)), []
+
+    def account_statuses(self, query, id):
+        instance = self.server.instance
+        if int(id) != 1:
+            return 200, [], []
+        return self.page(query, instance.counts["statuses"],
+                         PAGE_SIZES["statuses"], instance.own_status,
+                         lambda n: n not in instance.deleted)
+
+    def favourites(self, query):
+        instance = self.server.instance
+        return self.page(query, instance.counts["favourites"],
+                         PAGE_SIZES["favourites"], instance.favourite,
+                         lambda n: FAVOURITED + n not in instance.unfavourited)
+
+    def bookmarks(self, query):
+        instance = self.server.instance
+        return self.page(query, instance.counts["bookmarks"],
+                         PAGE_SIZES["bookmarks"], instance.bookmark)
+
+    def notifications(self, query):
+        instance = self.server.instance
+        types = query.get("types[]") or NOTIFICATION_TYPES
+        exclude = query.get("exclude_types[]") or []
+        def keep(n):
+            type = NOTIFICATION_TYPES[n % len(NOTIFICATION_TYPES)]
+            return (n not in instance.dismissed and type in types
+                    and type not in exclude)
+        return self.page(query, instance.counts["notifications"],
+                         PAGE_SIZES["notifications"], instance.notification,
+                         keep)
+
+    def dismiss(self, query, id):
+        self.server.instance.dismissed.add(int(id))
+        return 200, {}, []
+
+    def followers(self, query, id):
+        instance = self.server.instance
+        return self.page(query, instance.counts["followers"],
+                         PAGE_SIZES["accounts"],
+                         lambda n: instance.account(FOLLOWER + n))
+
+    def following(self, query, id):
+        instance = self.server.instance
+        return self.page(query, instance.counts["following"],
+                         PAGE_SIZES["accounts"],
+                         lambda n: instance.account(FOLLOWED + n))
+
+    def relationships(self, query):
+        instance = self.server.instance
+        ids = query.get("id[]") or query.get("id") or []
+        return 200, [instance.relationship(int(id)) for id in ids], []
+
+    def empty(self, query):
+        return 200, [], []
+
+    def status(self, query, id):
+        status = self.server.instance.lookup(int(id))
+        if status is None:
+            return 404, {"error": "Record not found"}, []
+        return 200, status, []
+
+    def delete(self, query, id):
+        instance = self.server.instance
+        status = instance.lookup(int(id))
+        if status is None:
+            return 404, {"error": "Record not found"}, []
+        instance.deleted.add(int(id))
+        return 200, status, []
+
+    def unfavourite(self, query, id):
+        instance = self.server.instance
+        status = instance.lookup(int(id))
+        if status is None:
+            return 404, {"error": "Record not found"}, []
+        instance.unfavourited.add(int(id))
+        status["favourited"] = False
+        return 200, status, []
+
+    def unreblog(self, query, id):
+        status = self.server.instance.lookup(int(id))
+        if status is None:
+            return 404, {"error": "Record not found"}, []
+        return 200, status, []
+
+ROUTES = {
+    "GET": [
+        (r"/api/v1/instance/?", "instance"),
+        (r"/api/v1/accounts/verify_credentials", "verify_credentials"),
+        (r"/api/v1/accounts/relationships", "relationships"),
+        (r"/api/v1/accounts/(\d+)/statuses", "account_statuses"),
+        (r"/api/v1/accounts/(\d+)/followers", "followers"),
+        (r"/api/v1/accounts/(\d+)/following", "following"),
+        (r"/api/v1/accounts/(\d+)", "account"),
+        (r"/api/v1/favourites", "favourites"),
+        (r"/api/v1/bookmarks", "bookmarks"),
+        (r"/api/v1/notifications", "notifications"),
+        (r"/api/v1/mutes", "empty"),
+        (r"/api/v1/blocks", "empty"),
+        (r"/api/v1/statuses/(\d+)", "status"),
+    ],
+    "POST": [
+        (r"/api/v1/statuses/(\d+)/unfavourite", "unfavourite"),
+        (r"/api/v1/statuses/(\d+)/unreblog", "unreblog"),
+        (r"/api/v1/notifications/(\d+)/dismiss", "dismiss"),
+    ],
+    "DELETE": [
+        (r"/api/v1/statuses/(\d+)", "delete"),
+    ],
+}
+
+def start(instance, port=0):
+    """
+    Start a server for the instance in a thread of its own and return
+    the server. Its URL is in server.url.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    server.instance = instance
+    server.url = "http://127.0.0.1:%d" % server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="""Pretend to be a Mastodon instance with a single
+        user, for benchmarks.""")
+    parser.add_argument("--port", type=int, default=8080,
+                        help='the port to listen on (default 8080)')
+    parser.add_argument("--statuses", type=int, default=1000,
+                        help='the number of statuses (default 1000)')
+    parser.add_argument("--favourites", type=int,
+                        help='the number of favourites (default: a tenth '
+                        'of the statuses)')
+    parser.add_argument("--bookmarks", type=int,
+                        help='the number of bookmarks (default: a twentieth '
+                        'of the statuses)')
+    parser.add_argument("--notifications", type=int,
+                        help='the number of notifications (default: a fifth '
+                        'of the statuses)')
+    parser.add_argument("--followers", type=int, default=200,
+                        help='the number of followers (default 200)')
+    parser.add_argument("--following", type=int, default=200,
+                        help='the number of people followed (default 200)')
+    parser.add_argument("--latency", type=float, default=0,
+                        help='the seconds every request takes (default 0)')
+    parser.add_argument("--rate-limit", type=int, default=300,
+                        help='the requests allowed per window (default 300)')
+    parser.add_argument("--window", type=float, default=300,
+                        help='the seconds until the rate limit resets '
+                        '(default 300)')
+    args = parser.parse_args()
+    instance = Instance(args.statuses, args.favourites, args.bookmarks,
+                        args.notifications, args.followers, args.following,
+                        args.latency, args.rate_limit, args.window)
+    server = start(instance, args.port)
+    print("Serving", server.url)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -14,7 +14,11 @@
 # this program. If not, see <http://www.gnu.org/licenses/>.
 
 import argparse
+import sys
 from . import core
+from . import connection
+from . import metrics
+from . import snapshot
 from . import archive
 from . import replies
 from . import text
@@ -32,6 +36,8 @@ from . import mutuals
 from . import login
 from . import fix
 from . import meow
+from . import convert
+from . import slim
 
 def main():
     parser = argparse.ArgumentParser(
@@ -43,6 +49,30 @@ def main():
 
     parser.add_argument("--quiet", "-q", action='store_true', default=False,
                         help='do not output normal status messages')
+    parser.add_argument("--cache", action='store_true', default=False,
+                        help='keep a snapshot of the parsed archive '
+                        'to load it faster next time')
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help='the number of processes reading split '
+                        'archives when combining them (default 1)')
+    parser.add_argument("--parallel", type=int, default=1,
+                        help='the number of accounts to run at the same '
+                        'time when using \'all\' (default 1)')
+    parser.add_argument("--record", metavar='DIR',
+                        help='write all requests and responses to DIR')
+    parser.add_argument("--replay", metavar='DIR',
+                        help='answer requests with the responses in DIR '
+                        'instead of asking the instance')
+    parser.add_argument("--replay-speed", type=float, default=1,
+                        metavar='FACTOR',
+                        help='multiply the time recorded requests took '
+                        'by this; 0 does not wait at all (default 1)')
+    parser.add_argument("--metrics", metavar='FILE',
+                        help='write requests, latency, bytes and rate limit '
+                        'waits per endpoint to FILE as JSON when done')
+    parser.add_argument("--metrics-textfile", metavar='FILE',
+                        help='write the same to FILE in the Prometheus text '
+                        'format, e.g. for the node exporter')
 
     subparsers = parser.add_subparsers()
 
@@ -86,6 +116,16 @@ def main():
                                 action='store_const',
                                 const=True, default=False,
                                 help='save updated versions of statuses')
+    parser_content.add_argument("--drop", dest='drop', action='append',
+                                metavar='FIELD',
+                                help='drop this field from everything '
+                                'fetched, e.g. account.source')
+    parser_content.add_argument("--connections", type=int, default=1,
+                                help='the number of collections to fetch '
+                                'at the same time (default 1)')
+    parser_content.add_argument("--async", dest='use_async', action='store_true',
+                                default=False, help='use the asyncio engine '
+                                'to talk to your instance (needs aiohttp)')
     parser_content.add_argument("--pace", dest='pace', action='store_const',
                                 const=True, default=False,
                                 help='avoid timeouts and pace requests')
@@ -100,6 +140,9 @@ def main():
     parser_content = subparsers.add_parser(
         name='replies',
         help='archive missing toots you replied to')
+    parser_content.add_argument("--async", dest='use_async', action='store_true',
+                                default=False, help='use the asyncio engine '
+                                'to talk to your instance (needs aiohttp)')
     parser_content.add_argument("--pace", dest='pace', action='store_const',
                                 const=True, default=False,
                                 help='avoid timeouts and pace requests')
@@ -387,12 +430,58 @@ def main():
                                 help="combine archives in case they are split")
     parser_content.set_defaults(command=meow.meow)
 
+    parser_content = subparsers.add_parser(
+        name='convert',
+        help='convert your archive to a different layout, codec or normalization')
+    parser_content.add_argument("--layout", dest='layout',
+                                choices=['json', 'folder', 'sqlite'],
+                                default='json',
+                                help='use a single JSON file, a folder with '
+                                'one JSON file per collection, or an SQLite '
+                                'database (default json)')
+    parser_content.add_argument("--codec", dest='codec',
+                                choices=['json', 'gzip', 'zstd', 'msgpack'],
+                                default='json',
+                                help='for the json layout, use pretty-printed '
+                                'JSON, compact JSON compressed with gzip or '
+                                'zstd, or MessagePack (default json)')
+    parser_content.add_argument("--normalize", action='append',
+                                choices=['accounts', 'statuses'],
+                                help='for the json layout, store every '
+                                'account or every status just once, '
+                                'even if it is used many times')
+    parser_content.add_argument("user",
+                                help='your account, e.g. kensanata@octogon.social')
+    parser_content.set_defaults(command=convert.convert)
+
+    parser_content = subparsers.add_parser(
+        name='slim',
+        help='drop fields nobody needs from your archive')
+    parser_content.add_argument("--drop", dest='drop', action='append',
+                                metavar='FIELD',
+                                help='drop this field, too, e.g. account.source')
+    parser_content.add_argument("--confirmed", dest='confirmed',
+                                action='store_const', const=True, default=False,
+                                help='perform the change on the archive')
+    parser_content.add_argument("user",
+                                help='your account, e.g. kensanata@octogon.social')
+    parser_content.set_defaults(command=slim.slim)
+
 
     args = parser.parse_args()
+    snapshot.enabled = args.cache
+    core.jobs = args.jobs
+    connection.record = args.record
+    connection.replay = args.replay
+    connection.replay_speed = args.replay_speed
+    metrics.json_file = args.metrics
+    metrics.textfile = args.metrics_textfile
 
     try:
         if hasattr(args, "command"):
-            if hasattr(args, "user") and args.user == 'all':
+            if hasattr(args, "user") and args.user == 'all' and args.parallel > 1:
+                sys.exit(core.run_all(args))
+            elif hasattr(args, "user") and args.user == 'all':
                 for user in core.all_accounts():
                     print(user)
                     args.user = user
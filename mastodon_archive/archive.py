@@ -14,12 +14,126 @@
 # You should have received a copy of the GNU General Public License along with
 # this program. If not, see <http://www.gnu.org/licenses/>.
 
+import copy
 import datetime
+import hashlib
+import json
+import queue
+import re
 import sys
+import threading
 import os.path
+from . import checkpoint
 from . import core
+from . import journal
+from . import slim
 from mastodon.errors import MastodonAPIError
 
+# Frequently changing, transient values that shouldn't trigger a
+# re-archive.
+IGNORED_KEYS = ("following_count", "followers_count", "statuses_count",
+                "last_status_at", "verified_at",
+                # dropped by slim.FIELDS but in older archives
+                "filtered", "text_url", "blurhash")
+
+# The notification types that aren't mentions, for exclude_types, so
+# that the instance only sends us mentions. Instances ignore the types
+# they don't know, and we still look at the type of every notification
+# in case there's a new one. We don't use types=["mention"] because it
+# needs Mastodon 3.5 and Mastodon.py 1.8.
+OTHER_NOTIFICATIONS = ["follow", "follow_request", "favourite", "reblog",
+                       "poll", "status", "update", "admin.sign_up",
+                       "admin.report", "severed_relationships",
+                       "moderation_warning", "move",
+                       "pleroma:emoji_reaction", "pleroma:chat_mention",
+                       "pleroma:report"]
+
+# dates with a time, not just a day
+datetime_string = re.compile(r'\d{4}-\d\d-\d\d.')
+
+def canonical(value):
+    """
+    Return a value for the fingerprint: None is the same as a missing
+    key, IGNORED_KEYS and keys starting with an underscore are ignored,
+    dates are strings in the same format and everything else is a
+    string, too, since IDs can be numbers or strings.
+    """
+    if isinstance(value, dict):
+        return {str(k): canonical(v) for k, v in value.items()
+                if v is not None and k not in IGNORED_KEYS
+                and not str(k).startswith("_")}
+    elif isinstance(value, (list, tuple)):
+        return [canonical(v) for v in value]
+    elif isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    elif isinstance(value, str) and datetime_string.match(value):
+        try:
+            return datetime.datetime.fromisoformat(value).isoformat()
+        except ValueError:
+            return value
+    elif value is None:
+        return None
+    return str(value)
+
+def fingerprint(item):
+    """
+    Return a hash of the content of a status (or whatever else).
+    """
+    text = json.dumps(canonical(item), sort_keys=True, ensure_ascii=False)
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+# the lines printed by the threads fetching collections at the same
+# time must not get mixed up
+output_lock = threading.Lock()
+
+def say(*args, file=None):
+    """
+    Print a line all at once.
+    """
+    with output_lock:
+        print(*args, file=file or sys.stdout, flush=True)
+
+def fetch_all(getters, connections, done):
+    """
+    Call the getters, up to connections of them at the same time, and
+    return what they returned by name. With more than one connection,
+    done is called with the name and the result of every getter as soon
+    as it is done. The threads don't keep you from stopping the command
+    with Ctrl+C.
+    """
+    results = {}
+    if connections <= 1:
+        for name, get in getters.items():
+            results[name] = get()
+        return results
+    todo = queue.Queue()
+    for item in getters.items():
+        todo.put(item)
+    finished = queue.Queue()
+    def work():
+        while True:
+            try:
+                name, get = todo.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                finished.put((name, get(), None))
+            except Exception as e:
+                finished.put((name, None, e))
+    for i in range(min(connections, len(getters))):
+        threading.Thread(target=work, daemon=True).start()
+    errors = []
+    for i in range(len(getters)):
+        name, result, error = finished.get()
+        if error is None:
+            results[name] = result
+            done(name, result)
+        else:
+            errors.append(error)
+    if errors:
+        raise errors[0]
+    return results
+
 def archive(args):
     """
     Archive your toots, favourites, and bookmarks from your Mastodon account
@@ -35,6 +149,8 @@ def archive(args):
     with_notes = args.with_notes
     stopping = args.stopping
     update = args.update
+    connections = args.connections
+    fields = slim.FIELDS + (args.drop or [])
 
     (username, domain) = core.parse(args.user)
 
@@ -62,60 +178,6 @@ def archive(args):
         # exit in either case
         sys.exit(1)
 
-    def recursive_compare(item1, item2):
-        """True if identical, False otherwise"""
-        # Filter out frequently changing, transient values that shouldn't
-        # trigger a re-archive.
-        ignore_keys = ("following_count", "followers_count", "statuses_count",
-                       "last_status_at", "verified_at")
-        if isinstance(item1, list):
-            if not isinstance(item2, list):
-                return False
-            try:
-                for v1, v2 in zip(item1, item2, strict=True):
-                    if not recursive_compare(v1, v2):
-                        return False
-            except ValueError:
-                return False
-            return True
-        elif isinstance(item1, dict):
-            if not isinstance(item2, dict):
-                return False
-            # Treat None as equivalent to not existing
-            item1 = {k: v for k, v in item1.items() if v is not None}
-            item2 = {k: v for k, v in item2.items() if v is not None}
-            if len(item1) != len(item2):
-                return False
-            for k1, v1 in item1.items():
-                if k1 in ignore_keys:
-                    continue
-                if k1 not in item2:
-                    return False
-                if not recursive_compare(v1, item2[k1]):
-                    return False
-            return True
-        elif d1 := core.date_handler(item1):
-            return True if d1 == item2 else d1 == core.date_handler(item2)
-        elif d2 := core.date_handler(item1):
-            return item1 == d2
-
-        # *sigh* two different string dates or datetimes in different formats
-        # representing identical values.
-        try:
-            d1 = datetime.date.fromisoformat(item1)
-            d2 = datetime.date.fromisoformat(item2)
-            return d1 == d2
-        except (TypeError, ValueError):
-            pass
-        try:
-            d1 = datetime.datetime.fromisoformat(item1)
-            d2 = datetime.datetime.fromisoformat(item2)
-            return d1 == d2
-        except (TypeError, ValueError):
-            pass
-        
-        return str(item1) == str(item2)
-
     # Returns True for new items, or an existing item to update, or False if
     # the provided item should not be saved, i.e., we've already got it.
     def should_keep(item, items, update):
@@ -128,11 +190,25 @@ def archive(args):
             return True
         if not update:
             return False
-        if recursive_compare(item, prev_item):
+        # archives made before fingerprints were stored lack them
+        if item["_fingerprint"] == (prev_item.get("_fingerprint")
+                                    or fingerprint(prev_item)):
             return False
         return prev_item
 
-    def complete(statuses, page, func = None):
+    def stamp(statuses):
+        """
+        Add the fingerprint to statuses about to be stored.
+        """
+        for status in statuses:
+            if status:
+                status["_fingerprint"] = fingerprint(status)
+        return statuses
+
+    # the changes to append to the journal instead of saving everything
+    changes = journal.Changes()
+
+    def complete(collection, statuses, page, func = None):
         """
         Why aren't we using Mastodon.fetch_remaining(first_page)? It
         requires some metadata for the next request to be known. This
@@ -144,14 +220,21 @@ def archive(args):
         page: we got all the pages there were. So the archive will
         have a ton of _pagination_prev keys but no _pagination_next
         keys. That's why we fetch it all over again. Expiry helps,
-        obviously.
+        obviously. Once the archive has cursors, newer() is used
+        instead, unless we're updating or not stopping.
         """
         # We use str() on the ID here and above because it could be a
         # MaybeSnowflakeIdType when we get it from Mastodon but it's a number
         # or string when it's stored in the JSON file, so we canonicalize it as
         # a string.
         seen = { str(status["id"]): status for status in statuses if status is not None }
-        if not args.quiet:
+        # the new items, newest first, to add in front of the others
+        # once we're done since every insert moves all of them
+        fresh = []
+        # progress bars get mixed up when fetching several collections
+        # at the same time
+        show_progress = not args.quiet and connections == 1
+        if show_progress:
             progress = core.progress_bar()
 
         # define function such that we can return from the inner and
@@ -161,7 +244,7 @@ def archive(args):
             duplicates = 0
             updated = 0
             while len(page) > 0:
-                if not args.quiet:
+                if show_progress:
                     progress()
                 for item in page:
                     status = item
@@ -169,170 +252,311 @@ def archive(args):
                     if "status" in item:
                         status = item["status"]
                     if status and "id" in status:
+                        # leave the page alone, fetch_next needs its
+                        # pagination information
+                        status = stamp(slim.strip([copy.copy(status)], fields))[0]
                         keep = should_keep(status, seen, update)
                         if keep is True:
                             if func is None or func(item):
-                                statuses.insert(count, status)
+                                fresh.append(status)
+                                changes.added(collection, status)
                                 count = count + 1
                         elif keep:
                             # It's a dict that should be replaced
                             if func is None or func(item):
                                 keep.clear()
                                 keep.update(status)
+                                changes.updated(collection, keep)
                                 updated += 1
                         else:
                             duplicates = duplicates + 1
                             if duplicates > 10 and stopping:
+                                if show_progress:
+                                    say() # at the end of the progress bar
                                 if not args.quiet:
-                                    print() # at the end of the progress bar
-                                    print("Seen 10 duplicates, stopping now.")
-                                    print("Use --no-stopping to prevent this.")
+                                    say("Seen 10 duplicates, stopping now.")
+                                    say("Use --no-stopping to prevent this.")
                                 return count
                 page = mastodon.fetch_next(page)
                 if page is None:
-                    if not args.quiet:
-                        print() # at the end of the progress bar
+                    if show_progress:
+                        say() # at the end of the progress bar
                     return count + updated
             # if len(page) was 0
             return count + updated
 
         count = process(page)
+        statuses[0:0] = fresh
         if not args.quiet:
-            print("Added or updated a total of %d new items" % count)
+            say("Added or updated a total of %d new items" % count)
         return statuses
 
-    def keep_mentions(notifications):
-        return [x.status for x in notifications if x.type == "mention"]
+    # For every collection, the parameters to get the items newer than
+    # the ones we have, as given by Mastodon the last time.
+    cursors = dict(data.get("cursors", {})) if data is not None else {}
 
-    if data is None or not "statuses" in data or len(data["statuses"]) == 0:
-        if not args.quiet:
-            print("Get all statuses (this may take a while)")
-        statuses = mastodon.account_statuses(user["id"], limit=100)
-        statuses = mastodon.fetch_remaining(
-            first_page = statuses)
-    else:
-        if not args.quiet:
-            print("Get new statuses")
-        statuses = complete(data["statuses"], mastodon.account_statuses(user["id"], limit=100))
+    def stored_cursor(collection):
+        """
+        Return the cursor for a collection unless we need to look at
+        older items, too.
+        """
+        if update or not stopping or data is None or collection not in data:
+            return None
+        return cursors.get(collection)
+
+    def remember(collection, page):
+        """
+        Remember the cursor of the newest page of a collection.
+        """
+        cursor = core.cursor(page)
+        if cursor:
+            cursors[collection] = cursor
 
-    if skip_favourites:
+    def newer(collection, statuses, page, func = None):
+        """
+        Add the items newer than the stored cursor to the front of the
+        statuses. The page is the first one after the cursor and the
+        pages that follow are newer still, so we walk them using
+        Mastodon.fetch_previous(page) until there are no more. Usually
+        there is just one page.
+        """
+        seen = { str(status["id"]) for status in statuses if status is not None }
+        fresh = []
+        pages = []
+        while page:
+            pages.append(page)
+            remember(collection, page)
+            page = mastodon.fetch_previous(page)
+        # every page is sorted newest first
+        for page in reversed(pages):
+            for item in page:
+                status = item
+                # possibly a notification containing a status
+                if "status" in item:
+                    status = item["status"]
+                if (status and "id" in status and str(status["id"]) not in seen
+                    and (func is None or func(item))):
+                    status = stamp(slim.strip([copy.copy(status)], fields))[0]
+                    fresh.append(status)
+                    changes.added(collection, status)
+                    seen.add(str(status["id"]))
+        statuses[0:0] = fresh
         if not args.quiet:
-            print("Skipping favourites")
-        if data is None or not "favourites" in data:
-            favourites = []
+            say("Added a total of %d new items" % len(fresh))
+        return statuses
+
+    def keep_mentions(notifications):
+        return [x["status"] for x in notifications if x["type"] == "mention"]
+
+    def fetch_remaining(collection, first_page, keep=None):
+        """
+        Fetch all the items of a collection, continuing from the
+        checkpoint if the last run failed.
+        """
+        items, cursor = checkpoint.fetch_remaining(
+            status_file, collection, mastodon, first_page, fields, keep,
+            args.quiet)
+        if cursor:
+            cursors[collection] = cursor
+        return items
+
+    def get_statuses():
+        cursor = stored_cursor("statuses")
+        if cursor:
+            if not args.quiet:
+                say("Get statuses since the last run")
+            statuses = newer("statuses", data["statuses"], mastodon.account_statuses(user["id"], limit=100, **cursor))
+        elif data is None or not "statuses" in data or len(data["statuses"]) == 0:
+            if not args.quiet:
+                say("Get all statuses (this may take a while)")
+            statuses = stamp(fetch_remaining("statuses", lambda: mastodon.account_statuses(user["id"], limit=100)))
         else:
-            favourites = data["favourites"]
-    elif data is None or not "favourites" in data or len(data["favourites"]) == 0:
-        if not args.quiet:
-            print("Get favourites (this may take a while)")
-        favourites = mastodon.favourites()
-        favourites = mastodon.fetch_remaining(
-            first_page = favourites)
-    else:
-        if not args.quiet:
-            print("Get new favourites")
-        favourites = complete(data["favourites"], mastodon.favourites())
+            if not args.quiet:
+                say("Get new statuses")
+            page = mastodon.account_statuses(user["id"], limit=100)
+            remember("statuses", page)
+            statuses = complete("statuses", data["statuses"], page)
+        return statuses
 
-    try:
-        if skip_bookmarks:
+    def get_favourites():
+        if skip_favourites:
             if not args.quiet:
-                print("Skipping bookmarks")
-            if data is None or not "bookmarks" in data:
-                bookmarks = []
+                say("Skipping favourites")
+            if data is None or not "favourites" in data:
+                favourites = []
             else:
-                bookmarks = data["bookmarks"]
-        elif data is None or not "bookmarks" in data or len(data["bookmarks"]) == 0:
+                favourites = data["favourites"]
+        elif stored_cursor("favourites"):
+            if not args.quiet:
+                say("Get favourites since the last run")
+            favourites = newer("favourites", data["favourites"], mastodon.favourites(**stored_cursor("favourites")))
+        elif data is None or not "favourites" in data or len(data["favourites"]) == 0:
             if not args.quiet:
-                print("Get bookmarks (this may take a while)")
-            bookmarks = mastodon.bookmarks()
-            bookmarks = mastodon.fetch_remaining(
-                first_page = bookmarks)
+                say("Get favourites (this may take a while)")
+            favourites = stamp(fetch_remaining("favourites", mastodon.favourites))
         else:
             if not args.quiet:
-                print("Get new bookmarks")
-            bookmarks = complete(data["bookmarks"], mastodon.bookmarks())
-    except AttributeError as e:
-        bookmarks = []
-        print("Skipping bookmarks since your Mastodon.py library is too old!")
-        print("You might have a file called upgrade_python-mastodon.sh on your system.")
-        print("Find it for example using 'locate upgrade_python-mastodon.sh' and then run it")
-        print("to attempt an upgrade in-place: 'bash /path/to/upgrade_python-mastodon.sh'")
-        print("If you don't have 'locate' installed, try to use 'find' to find the script:")
-        print("'find / -name upgrade_python-mastodon.sh'")
-
-    if not with_mentions:
-        if not args.quiet:
-            print("Skipping mentions")
-        if data is None or not "mentions" in data:
-            mentions = []
+                say("Get new favourites")
+            page = mastodon.favourites()
+            remember("favourites", page)
+            favourites = complete("favourites", data["favourites"], page)
+        return favourites
+
+    def get_bookmarks():
+        try:
+            if skip_bookmarks:
+                if not args.quiet:
+                    say("Skipping bookmarks")
+                if data is None or not "bookmarks" in data:
+                    bookmarks = []
+                else:
+                    bookmarks = data["bookmarks"]
+            elif stored_cursor("bookmarks"):
+                if not args.quiet:
+                    say("Get bookmarks since the last run")
+                bookmarks = newer("bookmarks", data["bookmarks"], mastodon.bookmarks(**stored_cursor("bookmarks")))
+            elif data is None or not "bookmarks" in data or len(data["bookmarks"]) == 0:
+                if not args.quiet:
+                    say("Get bookmarks (this may take a while)")
+                bookmarks = stamp(fetch_remaining("bookmarks", mastodon.bookmarks))
+            else:
+                if not args.quiet:
+                    say("Get new bookmarks")
+                page = mastodon.bookmarks()
+                remember("bookmarks", page)
+                bookmarks = complete("bookmarks", data["bookmarks"], page)
+        except AttributeError as e:
+            bookmarks = []
+            say("Skipping bookmarks since your Mastodon.py library is too old!")
+            say("You might have a file called upgrade_python-mastodon.sh on your system.")
+            say("Find it for example using 'locate upgrade_python-mastodon.sh' and then run it")
+            say("to attempt an upgrade in-place: 'bash /path/to/upgrade_python-mastodon.sh'")
+            say("If you don't have 'locate' installed, try to use 'find' to find the script:")
+            say("'find / -name upgrade_python-mastodon.sh'")
+        return bookmarks
+
+    def get_mentions():
+        if not with_mentions:
+            if not args.quiet:
+                say("Skipping mentions")
+            if data is None or not "mentions" in data:
+                mentions = []
+            else:
+                mentions = data["mentions"]
+        elif stored_cursor("mentions"):
+            if not args.quiet:
+                say("Get notifications since the last run and look for mentions")
+            is_mention = lambda x: "type" in x and x["type"] == "mention"
+            mentions = newer("mentions", data["mentions"], mastodon.notifications(limit=100, exclude_types=OTHER_NOTIFICATIONS, **stored_cursor("mentions")), is_mention)
+        elif data is None or not "mentions" in data or len(data["mentions"]) == 0:
+            if not args.quiet:
+                say("Get notifications and look for mentions (this may take a while)")
+            mentions = stamp(fetch_remaining("mentions", lambda: mastodon.notifications(limit=100, exclude_types=OTHER_NOTIFICATIONS), keep_mentions))
         else:
-            mentions = data["mentions"]
-    elif data is None or not "mentions" in data or len(data["mentions"]) == 0:
-        if not args.quiet:
-            print("Get notifications and look for mentions (this may take a while)")
-        notifications = mastodon.notifications(limit=100)
-        notifications = mastodon.fetch_remaining(
-            first_page = notifications)
-        mentions = keep_mentions(notifications)
-    else:
-        if not args.quiet:
-            print("Get new notifications and look for mentions")
-        is_mention = lambda x: "type" in x and x["type"] == "mention"
-        mentions = complete(data["mentions"], mastodon.notifications(limit=100), is_mention)
+            if not args.quiet:
+                say("Get new notifications and look for mentions")
+            is_mention = lambda x: "type" in x and x["type"] == "mention"
+            page = mastodon.notifications(limit=100, exclude_types=OTHER_NOTIFICATIONS)
+            remember("mentions", page)
+            mentions = complete("mentions", data["mentions"], page, is_mention)
+        return mentions
 
-    if not with_followers:
-        if not args.quiet:
-            print("Skipping followers")
-        if data is None or not "followers" in data:
-            followers = []
+    def get_followers():
+        if not with_followers:
+            if not args.quiet:
+                say("Skipping followers")
+            if data is None or not "followers" in data:
+                followers = []
+            else:
+                followers = data["followers"]
         else:
-            followers = data["followers"]
-    else:
-        if not args.quiet:
-            print("Get followers (this may take a while)")
-        followers = mastodon.account_followers(user.id, limit=100)
-        followers = mastodon.fetch_remaining(
-            first_page = followers)
+            if not args.quiet:
+                say("Get followers (this may take a while)")
+            followers = mastodon.account_followers(user.id, limit=100)
+            followers = slim.strip(mastodon.fetch_remaining(
+                first_page = followers), fields)
+        return followers
 
-    if not with_following:
-        if not args.quiet:
-            print("Skipping following")
-        if data is None or not "following" in data:
-            following = []
+    def get_following():
+        if not with_following:
+            if not args.quiet:
+                say("Skipping following")
+            if data is None or not "following" in data:
+                following = []
+            else:
+                following = data["following"]
         else:
-            following = data["following"]
-    else:
-        if not args.quiet:
-            print("Get following (this may take a while)")
-        following = mastodon.account_following(user.id, limit=100)
-        following = mastodon.fetch_remaining(
-            first_page = following)
+            if not args.quiet:
+                say("Get following (this may take a while)")
+            following = mastodon.account_following(user.id, limit=100)
+            following = slim.strip(mastodon.fetch_remaining(
+                first_page = following), fields)
+        return following
 
-    if not with_mutes:
-        if not args.quiet:
-            print("Skipping mutes")
-        if data is None or not "mutes" in data:
-            mutes = []
+    def get_mutes():
+        if not with_mutes:
+            if not args.quiet:
+                say("Skipping mutes")
+            if data is None or not "mutes" in data:
+                mutes = []
+            else:
+                mutes = data["mutes"]
         else:
-            mutes = data["mutes"]
-    else:
-        if not args.quiet:
-            print("Get mutes (this may take a while)")
-        mutes = mastodon.mutes(limit=100)
-        mutes = mastodon.fetch_remaining(first_page = mutes)
+            if not args.quiet:
+                say("Get mutes (this may take a while)")
+            mutes = mastodon.mutes(limit=100)
+            mutes = slim.strip(mastodon.fetch_remaining(first_page = mutes),
+                            fields)
+        return mutes
 
-    if not with_blocks:
-        if not args.quiet:
-            print("Skipping blocks")
-        if data is None or not "blocks" in data:
-            blocks = []
+    def get_blocks():
+        if not with_blocks:
+            if not args.quiet:
+                say("Skipping blocks")
+            if data is None or not "blocks" in data:
+                blocks = []
+            else:
+                blocks = data["blocks"]
         else:
-            blocks = data["blocks"]
-    else:
-        if not args.quiet:
-            print("Get blocks (this may take a while)")
-        blocks = mastodon.blocks(limit=100)
-        blocks = mastodon.fetch_remaining(first_page = blocks)
+            if not args.quiet:
+                say("Get blocks (this may take a while)")
+            blocks = mastodon.blocks(limit=100)
+            blocks = slim.strip(mastodon.fetch_remaining(first_page = blocks),
+                            fields)
+        return blocks
+
+    # The collections are independent of each other and are fetched at
+    # the same time, sharing the rate limit.
+    getters = {
+        'statuses': get_statuses,
+        'favourites': get_favourites,
+        'bookmarks': get_bookmarks,
+        'mentions': get_mentions,
+        'followers': get_followers,
+        'following': get_following,
+        'mutes': get_mutes,
+        'blocks': get_blocks,
+    }
+    skipped = { 'favourites': skip_favourites,
+                'bookmarks': skip_bookmarks,
+                'mentions': not with_mentions,
+                'followers': not with_followers,
+                'following': not with_following,
+                'mutes': not with_mutes,
+                'blocks': not with_blocks }
+    def done(name, items):
+        # instead of the progress bars, say which collection is done
+        if not args.quiet and not skipped.get(name):
+            say("Done with %s: %d items" % (name, len(items)))
+    results = fetch_all(getters, connections, done)
+    statuses = results['statuses']
+    favourites = results['favourites']
+    bookmarks = results['bookmarks']
+    mentions = results['mentions']
+    followers = results['followers']
+    following = results['following']
+    mutes = results['mutes']
+    blocks = results['blocks']
 
     if not with_notes:
         if not args.quiet:
@@ -367,7 +591,12 @@ def archive(args):
             notes.extend(({'id': u.id, 'note': u.note}
                           for u in relationships if u.note))
 
-    data = {
+    # Update the loaded archive instead of replacing it so that lazily
+    # loaded layouts only save what we touched and collections such as
+    # replies are kept.
+    if data is None:
+        data = {}
+    collections = {
         'account': user,
         'statuses': statuses,
         'favourites': favourites,
@@ -378,7 +607,14 @@ def archive(args):
         'mutes': mutes,
         'blocks': blocks,
         'notes': notes,
+        'cursors': cursors,
     }
+    # collections completed or skipped are the ones we loaded, the
+    # others were fetched again
+    for name, value in collections.items():
+        if name not in data or value is not data[name]:
+            changes.replaced(name)
+    data.update(collections)
 
     if not args.quiet:
         print("Saving %d statuses, %d favourites, %d bookmarks, %d mentions, %d followers, %d following, %d mutes, %d blocks, %d notes" % (
@@ -392,4 +628,5 @@ def archive(args):
             len(blocks),
             len(notes)))
 
-    core.save(status_file, data, quiet=args.quiet)
+    core.save(status_file, data, quiet=args.quiet, changes=changes)
+    checkpoint.remove(status_file)
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026  Alex Schroeder <alex@gnu.org>
+
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+# The first time you archive your account, fetching all your statuses,
+# favourites, bookmarks and notifications can take hours. Every page
+# fetched is appended to a checkpoint next to the archive, one JSON
+# object per line and one file per collection:
+#
+# example.org.user.alex.json
+# example.org.user.alex.json.statuses.checkpoint
+#
+# Every line has the items of a page and the pagination information for
+# the next page ("next"). The first line also has the cursor for the
+# newest items ("cursor"). If the archive command fails, the next run
+# continues where the last one stopped. Once the archive is saved, the
+# checkpoints are removed.
+#
+# Once all the pages are there, the collection is read from the
+# checkpoint, so it has what was fetched before we were interrupted.
+# It is all in memory then, since the archive is saved as a whole. For
+# mentions, only the mentions are kept, not all the notifications.
+#
+# If we were interrupted while writing, the last line is incomplete. It
+# is cut off before continuing so that the pages fetched next start on
+# a line of their own.
+
+import glob
+import json
+import os
+import sys
+import time
+from mastodon.errors import MastodonNetworkError, MastodonServerError
+from . import core
+from . import slim
+
+# the seconds to wait before trying again after a network error or a
+# server error such as "502 Bad Gateway"
+DELAYS = [1, 2, 4, 8, 16, 32, 64]
+
+def checkpoint_file(file_name, collection):
+    return file_name + "." + collection + ".checkpoint"
+
+def pages(file_name, collection):
+    """
+    Yield the pages in the checkpoint of a collection.
+    """
+    path = checkpoint_file(file_name, collection)
+    if not os.path.isfile(path):
+        return
+    with open(path, encoding='utf-8') as fp:
+        for line in fp:
+            try:
+                page = json.loads(line)
+            except ValueError:
+                # the last line is incomplete if we were interrupted
+                return
+            yield page
+
+def items(file_name, collection):
+    """
+    Yield the items in the checkpoint of a collection.
+    """
+    for page in pages(file_name, collection):
+        yield from page["items"]
+
+def repair(file_name, collection):
+    """
+    Cut off the incomplete line at the end of the checkpoint of a
+    collection, if there is one.
+    """
+    path = checkpoint_file(file_name, collection)
+    if not os.path.isfile(path):
+        return
+    size = 0
+    with open(path, mode='rb') as fp:
+        for line in fp:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                json.loads(line)
+            except ValueError:
+                break
+            size += len(line)
+    if size < os.path.getsize(path):
+        with open(path, mode='r+b') as fp:
+            fp.truncate(size)
+
+def read(file_name, collection):
+    """
+    Return the number of items in the checkpoint of a collection, the
+    cursor for newer items, the pagination information for the next
+    page, and whether there is a checkpoint at all.
+    """
+    count = 0
+    cursor = None
+    following = None
+    resumed = False
+    for page in pages(file_name, collection):
+        count += len(page["items"])
+        cursor = page.get("cursor", cursor)
+        following = page["next"]
+        resumed = True
+    return count, cursor, following, resumed
+
+def append(file_name, collection, items, following, cursor=None):
+    """
+    Append a page to the checkpoint of a collection.
+    """
+    page = {"items": items, "next": following}
+    if cursor is not None:
+        page["cursor"] = cursor
+    with open(checkpoint_file(file_name, collection), mode='a',
+              encoding='utf-8') as fp:
+        fp.write(json.dumps(page, default=core.date_handler) + "\n")
+
+def remove(file_name):
+    """
+    Remove the checkpoints of an archive.
+    """
+    for path in glob.glob(glob.escape(file_name) + ".*.checkpoint"):
+        os.remove(path)
+
+def retry(call, quiet=False):
+    """
+    Return what call returns, trying again a few times after errors
+    that usually go away.
+    """
+    for delay in DELAYS:
+        try:
+            return call()
+        except (MastodonNetworkError, MastodonServerError) as e:
+            if not quiet:
+                print("%s, trying again in %ds" % (e, delay), file=sys.stderr)
+            time.sleep(delay)
+    return call()
+
+def fetch_remaining(file_name, collection, mastodon, first_page, fields,
+                    keep=None, quiet=False):
+    """
+    Return all the items of a collection and the cursor for newer
+    items. first_page is called to get the first page unless there is a
+    checkpoint to continue from. Every page is stripped of the fields
+    and added to the checkpoint. If given, keep is called for every page
+    and returns the items to add.
+    """
+    repair(file_name, collection)
+    count, cursor, following, resumed = read(file_name, collection)
+    if resumed:
+        if not quiet:
+            print("Continuing %s after %d items" % (collection, count))
+        page = retry(lambda: mastodon.fetch_next(following), quiet) if following else None
+    else:
+        page = retry(first_page, quiet)
+        cursor = core.cursor(page)
+    while page:
+        # get the pagination information before it's stripped
+        following = core.pagination(page, "next")
+        page = slim.strip(list(page), fields)
+        if keep:
+            page = keep(page)
+        append(file_name, collection, page, following, None if resumed else cursor)
+        count += len(page)
+        resumed = True
+        if not following:
+            break
+        page = retry(lambda: mastodon.fetch_next(following), quiet)
+    result = list(items(file_name, collection))
+    if len(result) != count:
+        raise ValueError("The checkpoint %s has %d items instead of %d"
+                         % (checkpoint_file(file_name, collection),
+                            len(result), count))
+    return result, cursor
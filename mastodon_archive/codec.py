@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026  Alex Schroeder <alex@gnu.org>
+
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+# An archive in the json layout is always called by its .json name but
+# the file on disk may use a different codec, recognized by its
+# extension:
+#
+# example.org.user.alex.json       pretty-printed JSON
+# example.org.user.alex.json.gz    compact JSON, gzip compressed
+# example.org.user.alex.json.zst   compact JSON, zstd compressed
+# example.org.user.alex.msgpack    MessagePack
+#
+# If orjson is installed, it is used to read JSON and to write the
+# compact JSON of the gzip and zstd codecs. That JSON is the same as
+# without it, except for the exponents of huge and tiny numbers.
+# Pretty-printed JSON is always written by the json module, with
+# non-ASCII characters escaped, as it always has been. The
+# zstd and msgpack codecs need zstandard and msgpack, respectively.
+
+import gzip
+import io
+import json
+import os
+import re
+import sys
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+CODECS = {
+    "json": ".json",
+    "gzip": ".json.gz",
+    "zstd": ".json.zst",
+    "msgpack": ".msgpack",
+}
+
+# the Python module each codec needs, if any
+MODULES = {
+    "zstd": ("zstandard", lambda: zstandard),
+    "msgpack": ("msgpack", lambda: msgpack),
+}
+
+def codec_file(file_name, codec):
+    """
+    Return the file using a codec for an archive.
+    """
+    return re.sub(r"\.json$", "", file_name) + CODECS[codec]
+
+def archive_codec(file_name):
+    """
+    Return the codec of an existing archive, or None if there is no
+    archive.
+    """
+    for codec in CODECS:
+        if os.path.isfile(codec_file(file_name, codec)):
+            return codec
+    return None
+
+def resolve(file_name):
+    """
+    Return the file actually holding an archive. If there is no
+    archive, that's the file name itself.
+    """
+    codec = archive_codec(file_name)
+    return codec_file(file_name, codec) if codec else file_name
+
+def exists(file_name):
+    return archive_codec(file_name) is not None
+
+def check(codec):
+    """
+    Exit if the module needed for a codec is not installed.
+    """
+    if codec in MODULES:
+        name, module = MODULES[codec]
+        if module() is None:
+            print("The %s codec needs the %s module: pip install %s"
+                  % (codec, name, name), file=sys.stderr)
+            sys.exit(5)
+
+def remove_others(file_name, codec):
+    """
+    Remove the files of an archive using codecs other than this one.
+    """
+    for other in CODECS:
+        if other != codec and os.path.isfile(codec_file(file_name, other)):
+            os.remove(codec_file(file_name, other))
+
+def json_dumps(data, default, pretty):
+    """
+    Return the JSON encoding of data as bytes.
+    """
+    if pretty:
+        return json.dumps(data, indent=2, default=default).encode('utf-8')
+    if orjson is not None:
+        try:
+            # dates are left to default, just like json does
+            return orjson.dumps(data, default=default,
+                                option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except TypeError:
+            # orjson is stricter than json, e.g. about huge integers
+            pass
+    text = json.dumps(data, separators=(',', ':'), ensure_ascii=False,
+                      default=default)
+    return text.encode('utf-8')
+
+def json_loads(raw):
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+def read(file_name):
+    """
+    Read an archive using whatever codec it uses.
+    """
+    codec = archive_codec(file_name)
+    check(codec)
+    with open(codec_file(file_name, codec), mode='rb') as fp:
+        raw = fp.read()
+    if codec == "gzip":
+        raw = gzip.decompress(raw)
+    elif codec == "zstd":
+        raw = zstandard.ZstdDecompressor().decompressobj().decompress(raw)
+    elif codec == "msgpack":
+        return msgpack.unpackb(raw, raw=False)
+    return json_loads(raw)
+
+def write(file_name, data, codec, default=None):
+    """
+    Write an archive using a codec and return the file written.
+    """
+    check(codec)
+    if codec == "msgpack":
+        raw = msgpack.packb(data, default=default, use_bin_type=True)
+    else:
+        # whitespace only makes sense if you're going to read it
+        raw = json_dumps(data, default, pretty=(codec == "json"))
+        if codec == "gzip":
+            raw = gzip.compress(raw)
+        elif codec == "zstd":
+            raw = zstandard.ZstdCompressor().compress(raw)
+    path = codec_file(file_name, codec)
+    with open(path, mode='wb') as fp:
+        fp.write(raw)
+    return path
+
+def first_item(file_name):
+    """
+    Return the first key and value of an archive without reading all
+    of it, or None if it's empty or not a JSON object.
+    """
+    codec = archive_codec(file_name)
+    check(codec)
+    if codec == "msgpack":
+        with open(codec_file(file_name, codec), mode='rb') as fp:
+            unpacker = msgpack.Unpacker(fp, raw=False)
+            try:
+                if unpacker.read_map_header() == 0:
+                    return None
+                return unpacker.unpack(), unpacker.unpack()
+            except (msgpack.OutOfData, ValueError):
+                return None
+    with open_text(file_name) as fp:
+        m = re.match(r'\s*\{\s*"(\w+)"\s*:\s*"(\w+)"', fp.read(100))
+    return m.groups() if m else None
+
+def open_text(file_name):
+    """
+    Open an archive as a JSON text stream, or return None if it doesn't
+    use JSON.
+    """
+    codec = archive_codec(file_name)
+    check(codec)
+    path = codec_file(file_name, codec)
+    if codec == "json":
+        return open(path, mode='r', encoding='utf-8')
+    elif codec == "gzip":
+        return gzip.open(path, mode='rt', encoding='utf-8')
+    elif codec == "zstd":
+        fp = open(path, mode='rb')
+        reader = zstandard.ZstdDecompressor().stream_reader(fp, closefd=True)
+        return io.TextIOWrapper(reader, encoding='utf-8')
+    return None
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026  Alex Schroeder <alex@gnu.org>
+
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+# Opening a new connection for every request means a new TLS handshake
+# for every request, and when downloading media files, that's most of
+# the time spent. All requests, to the API and for media files, go
+# through the same session instead. It keeps the connections to every
+# host open and reuses them.
+#
+# The session is also where requests are recorded and replayed (see
+# recorder.py) and counted (see metrics.py).
+
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from . import metrics
+from . import recorder
+
+# the number of hosts to keep connections to
+POOL_HOSTS = 32
+
+# the number of connections to keep open for every host; the archive
+# command fetches several collections at the same time
+POOL_SIZE = 8
+
+# the directories set by the --record and --replay options
+record = None
+replay = None
+
+# how fast to replay, set by the --replay-speed option
+replay_speed = 1
+
+_session = None
+_lock = threading.Lock()
+
+def session():
+    """
+    Return the session shared by all requests.
+    """
+    global _session
+    with _lock:
+        if _session is None:
+            _session = requests.Session()
+            if replay:
+                adapter = recorder.Player(replay, replay_speed)
+            elif record:
+                adapter = recorder.Recorder(
+                    record, pool_connections=POOL_HOSTS,
+                    pool_maxsize=POOL_SIZE, pool_block=True)
+            else:
+                adapter = HTTPAdapter(pool_connections=POOL_HOSTS,
+                                      pool_maxsize=POOL_SIZE, pool_block=True)
+            adapter = metrics.Meter(adapter)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
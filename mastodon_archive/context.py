@@ -18,6 +18,7 @@ import os.path
 import html2text
 import re
 from . import core
+from . import database
 
 class Found(Exception): pass
 
@@ -31,41 +32,70 @@ def context(args):
     (username, domain) = core.parse(args.user)
 
     status_file = domain + '.user.' + username + '.json'
-    data = core.load(status_file, required = True, quiet = True)
 
     found = None;
     index = {} # mapping ids to statuses
     children = {} # mapping ids to list of children ids
 
-    for collection in ["statuses",
-                       "favourites",
-                       "bookmarks",
-                       "mentions"]:
-        statuses = data[collection];
-        if not args.quiet:
-            print("Indexing %d %s..." % (len(statuses), collection))
-        for status in statuses:
-
-            if status["reblog"] is not None:
-                status = status["reblog"]
-
-            # only accept one status per id
-            if status["id"] in index:
-                pass
-                # print("Warning: duplicate id %s" % status["id"], file=sys.stderr)
-            else:
+    if core.archive_layout(status_file) == "sqlite":
+
+        # Use the indexes to get just the statuses we need
+        found = next(database.statuses(status_file, "uri = ? OR url = ?",
+                                       (url, url)), None)
+        if found:
+            index[found["id"]] = found
+            id = found["in_reply_to_id"]
+            while id is not None and id not in index:
+                status = next(database.statuses(
+                    status_file, "reblog_id = ? OR id = ? AND reblog_id IS NULL",
+                    (id, id)), None)
+                if status is None:
+                    break
                 index[status["id"]] = status
-                if "in_reply_to_id" in status:
-                    if status["in_reply_to_id"] not in children:
-                        children[status["in_reply_to_id"]] = [status["id"]]
-                    else:
-                        children[status["in_reply_to_id"]].append(status["id"])
-
-            for u in [status["uri"],
-                      status["url"]]:
-                if u == url:
-                    found = status
-                    # don't break, we want to index them all
+                id = status["in_reply_to_id"]
+            ids = [found["id"]]
+            while ids:
+                id = ids.pop(0)
+                for status in database.statuses(
+                        status_file, "in_reply_to_id = ?", (id,)):
+                    if status["id"] not in index:
+                        index[status["id"]] = status
+                        children.setdefault(id, []).append(status["id"])
+                        ids.append(status["id"])
+
+    else:
+
+        data = core.load(status_file, required = True, quiet = True)
+
+        for collection in ["statuses",
+                           "favourites",
+                           "bookmarks",
+                           "mentions"]:
+            statuses = data[collection];
+            if not args.quiet:
+                print("Indexing %d %s..." % (len(statuses), collection))
+            for status in statuses:
+
+                if status["reblog"] is not None:
+                    status = status["reblog"]
+
+                # only accept one status per id
+                if status["id"] in index:
+                    pass
+                    # print("Warning: duplicate id %s" % status["id"], file=sys.stderr)
+                else:
+                    index[status["id"]] = status
+                    if "in_reply_to_id" in status:
+                        if status["in_reply_to_id"] not in children:
+                            children[status["in_reply_to_id"]] = [status["id"]]
+                        else:
+                            children[status["in_reply_to_id"]].append(status["id"])
+
+                for u in [status["uri"],
+                          status["url"]]:
+                    if u == url:
+                        found = status
+                        # don't break, we want to index them all
 
     if not found:
         print("The URL/URI was not found", file=sys.stderr)
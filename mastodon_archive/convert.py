@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026  Alex Schroeder <alex@gnu.org>
+
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+from . import core
+from . import codec
+from . import folder
+from . import database
+from . import journal
+from . import normalize
+from . import snapshot
+
+def convert(args):
+    """
+    Convert the archive and its split archives to a different layout,
+    codec or normalization
+    """
+
+    layout = args.layout
+    codec_name = args.codec
+    codec.check(codec_name)
+
+    (username, domain) = core.parse(args.user)
+
+    status_file = domain + '.user.' + username + '.json'
+    if not codec.exists(status_file):
+        print("You need to create an archive, first", file=sys.stderr)
+        sys.exit(2)
+
+    # the codec and normalization only matter for the json layout
+    normalized = sorted(set(args.normalize or []))
+    if layout == "json":
+        target = "json layout with the %s codec" % codec_name
+        if normalized:
+            target += " and normalized " + ", ".join(normalized)
+    else:
+        target = "%s layout" % layout
+
+    for file_name in [status_file] + core.split_archives(status_file):
+        old_layout = core.archive_layout(file_name)
+        old_codec = codec.archive_codec(file_name)
+        if old_layout == layout and layout != "json":
+            if not args.quiet:
+                print("%s already uses the %s" % (file_name, target))
+            continue
+
+        data = core.load(file_name, quiet=args.quiet)
+
+        if (old_layout == layout and old_codec == codec_name
+            and normalize.modes(data) == normalized):
+            if journal.size(file_name) > 0:
+                # converting to the same layout compacts the journal
+                if not args.quiet:
+                    print("Compacting", journal.journal_file(file_name))
+                core.save(file_name, data, quiet=args.quiet)
+            elif not args.quiet:
+                print("%s already uses the %s" % (codec.resolve(file_name), target))
+            continue
+
+        if not args.quiet:
+            print("Converting %s to the %s" % (codec.resolve(file_name), target))
+        if layout == "json" and normalized:
+            data["normalized"] = normalized
+        else:
+            data.pop("normalized", None)
+        if layout == "json":
+            core.save(file_name, data, quiet=args.quiet, layout=layout,
+                      codec_name=codec_name)
+        else:
+            core.save(file_name, data, quiet=args.quiet, layout=layout)
+
+        if old_layout == "json":
+            journal.remove(file_name)
+            snapshot.remove(file_name)
+            if layout != "json":
+                # the manifest replaces the archive
+                codec.remove_others(file_name, "json")
+        elif old_layout == "folder":
+            folder.remove(file_name)
+        elif old_layout == "sqlite":
+            database.remove(file_name)
@@ -19,8 +19,35 @@ import os.path
 import datetime
 import json
 import glob
+import gc
+import concurrent.futures
+import contextlib
+import heapq
+import io
+import itertools
 import re
 import shutil
+import traceback
+from . import codec
+from . import connection
+from . import folder
+from . import database
+from . import engine
+from . import journal
+from . import metrics
+from . import normalize
+from . import ratelimit
+from . import snapshot
+
+# The collections moved to split archives and combined again on load
+SPLIT_COLLECTIONS = ["statuses", "favourites", "bookmarks", "mentions"]
+
+# The number of processes reading split archives, set by the --jobs option
+jobs = 1
+
+# Whether to overwrite existing backups without asking, set when
+# running accounts with --parallel since nobody can answer
+overwrite_backups = False
 
 def progress_bar(chars="▏▎▍▌▋▊▉█"):
     """
@@ -94,7 +121,17 @@ def login(args, scopes=('read',)):
     """
     pace = hasattr(args, 'pace') and args.pace
     app = App(args.user, scopes=scopes, pace=pace)
-    return app.login()
+    mastodon = app.login()
+    if getattr(args, 'use_async', False) and (connection.record or connection.replay):
+        # the engine doesn't use the session
+        print("The --async option is ignored when recording or replaying",
+              file=sys.stderr)
+        args.use_async = False
+    elif getattr(args, 'use_async', False):
+        return ratelimit.Budget(
+            engine.Engine(mastodon.api_base_url, mastodon.access_token),
+            app.domain, pace=False)
+    return ratelimit.Budget(mastodon, app.domain)
 
 class App:
     """
@@ -110,6 +147,13 @@ class App:
         self.scopes = scopes
         self.client_secret = self.domain + ".client.secret"
         self.user_secret = self.domain + ".user." + self.username + ".secret"
+        if os.path.isfile(self.client_secret):
+            # use the URL the app was registered with, e.g. the plain
+            # http URL of the benchmark server
+            with open(self.client_secret) as fp:
+                lines = fp.read().splitlines()
+            if len(lines) > 2 and lines[2].startswith(("http://", "https://")):
+                self.url = lines[2].rstrip("/")
         self.pace = pace
         self.version_check = version_check
 
@@ -220,7 +264,8 @@ class App:
                     api_base_url=url,
                     ratelimit_method="pace",
                     ratelimit_pacefactor=0.9,
-                    request_timeout=300
+                    request_timeout=300,
+                    session=connection.session()
                 )
 
             else:
@@ -232,105 +277,548 @@ class App:
                     access_token=user_secret,
                     version_check_mode=version_check,
                     api_base_url=url,
+                    session=connection.session()
                 )
 
         return mastodon
 
+def split_archives(file_name):
+    """
+    Return the file names of the split archives belonging to an
+    archive, latest first. These are .json names no matter what codec
+    the split archives use.
+    """
+    archives = []
+    base = re.sub(r"\.json$", "", file_name)
+    for archive in glob.glob(glob.escape(base) + ".*"):
+        m = re.match(re.escape(base) + r"\.(\d+)(?:\.json|\.json\.gz"
+                     r"|\.json\.zst|\.msgpack)$", archive)
+        if m:
+            archives.append((int(m.group(1)), "%s.%s.json" % (base, m.group(1))))
+    return [archive for n, archive in sorted(set(archives), reverse=True)]
+
+def archive_layout(file_name):
+    """
+    Return the layout of an archive: "json" if everything is in a
+    single JSON file, "folder" if there is a manifest and one file per
+    collection, "sqlite" if there is a manifest and an SQLite database,
+    or None if there is no archive.
+    """
+    if not codec.exists(file_name):
+        return None
+    first = codec.first_item(file_name)
+    if first and first[0] == "layout":
+        return first[1]
+    return "json"
+
 def load(file_name, required=False, quiet=False, combine=False):
     """
     Load the JSON data from a file.
     """
 
-    if required and not os.path.isfile(file_name):
+    if required and not codec.exists(file_name):
         print("You need to create an archive, first", file=sys.stderr)
         sys.exit(2)
 
-    if os.path.isfile(file_name) and os.path.getsize(file_name) > 0:
-
-        def _json_load(fname):
-            if not quiet:
-                print("Loading existing archive:", fname)
+    layout = archive_layout(file_name)
+    if layout == "folder":
+        return folder.load(file_name, quiet=quiet, combine=combine)
+    elif layout == "sqlite":
+        return database.load(file_name, quiet=quiet, combine=combine)
 
-            with open(fname, mode='r', encoding='utf-8') as fp:
-                return json.load(fp)
+    if codec.exists(file_name) and os.path.getsize(codec.resolve(file_name)) > 0:
 
-        data = _json_load(file_name)
+        archives = []
         if combine:
             # Load latest archive first to keep chronological order
-            archives = list(
-                reversed(glob.glob(file_name.replace(".json", ".*.json")))
-            )
+            archives = split_archives(file_name)
 
             if required and not quiet and not archives:
                 print("Warning: No split archives to combine", file=sys.stderr)
 
-            # Merge dictionaries loaded from JSON archives
-            for archive in archives:
-                archived_data = _json_load(archive)
+        data, *archived_data = read_archives([file_name] + archives, quiet)
 
-                for collection in ["statuses", "favourites", "bookmarks", "mentions"]:
-                    if collection in archived_data:
-                        data[collection].extend(archived_data[collection])
+        # Sort statuses
+        for d in [data] + archived_data:
+            if "statuses" in d:
+                d["statuses"].sort(key=lambda x: x["created_at"], reverse=True)
+
+        if combine:
+            # Merge the collections of the JSON archives
+            for collection in SPLIT_COLLECTIONS:
+                sequences = [d[collection] for d in [data] + archived_data
+                             if collection in d]
+                if sequences:
+                    data[collection] = list(merge(sequences, collection))
 
         # Bookmarks are a recent addition so older archives don't have any
         if "bookmarks" not in data:
             data["bookmarks"] = []
 
-        # Sort statuses
-        data["statuses"].sort(key=lambda x: x["created_at"], reverse=True)
-
         return data
 
     return None
 
+def read_archive(file_name, shared=False):
+    """
+    Read an archive in the json layout and apply its journal, or use
+    the snapshot if there is one. If shared is True, the next shared
+    read may return the same data, so don't change it.
+    """
+    data = snapshot.read(file_name, shared)
+    if data is None:
+        data = normalize.expand(codec.read(file_name))
+        journal.apply(data, journal.read(file_name))
+        snapshot.write(file_name, data, shared)
+    return data
+
+def read_archive_job(file_name, cache):
+    """
+    Read an archive in a separate process.
+    """
+    snapshot.enabled = cache
+    gc.disable()
+    return read_archive(file_name)
+
+def read_archives(file_names, quiet=False):
+    """
+    Read archives in the json layout. If the --jobs option allows it,
+    the first one is read while other processes read the rest.
+    """
+    if not quiet:
+        for file_name in file_names:
+            print("Loading existing archive:", codec.resolve(file_name))
+    # the garbage collector has nothing to find in freshly parsed data
+    # but it slows parsing down a lot
+    enabled_gc = gc.isenabled()
+    gc.disable()
+    try:
+        if jobs <= 1 or len(file_names) <= 1:
+            return [read_archive(file_name) for file_name in file_names]
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(read_archive_job, file_name,
+                                       snapshot.enabled)
+                       for file_name in file_names[1:]]
+            data = read_archive(file_names[0])
+            return [data] + [future.result() for future in futures]
+    finally:
+        if enabled_gc:
+            gc.enable()
+
+class Scanner:
+    """
+    Read a JSON document in chunks so that a single top-level value
+    can be extracted without parsing the rest of the file.
+    """
+
+    chunk_size = 1 << 16
+    whitespace = re.compile(r'[ \t\n\r]*')
+    structure = re.compile(r'["\[\]{}]')
+    string = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self):
+        """
+        Drop what has been consumed and read another chunk. Returns
+        False at the end of the file.
+        """
+        if self.eof:
+            return False
+        self.buf = self.buf[self.pos:]
+        self.pos = 0
+        # read at least as much as we already have so that a huge value
+        # doesn't get decoded over and over again
+        chunk = self.fp.read(max(self.chunk_size, len(self.buf)))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf += chunk
+        return True
+
+    def peek(self):
+        """
+        Skip whitespace and return the next character, or the empty
+        string at the end of the file.
+        """
+        while True:
+            self.pos = self.whitespace.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, chars):
+        """
+        Consume one of the structural characters in chars and return it.
+        """
+        c = self.peek()
+        if not c or c not in chars:
+            raise ValueError("Expected one of %s at offset %d but got %r"
+                             % (chars, self.pos, c))
+        self.pos += 1
+        return c
+
+    def decode(self):
+        """
+        Decode the next value.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # a number at the end of the buffer might continue
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+    def skip(self):
+        """
+        Skip the next value without decoding it.
+        """
+        if self.peek() not in '[{':
+            self.decode()
+            return
+        depth = 0
+        while True:
+            m = self.structure.search(self.buf, self.pos)
+            if m is None:
+                self.pos = len(self.buf)
+                self.more()
+                continue
+            c = m.group()
+            if c == '"':
+                self.pos = m.start()
+                self.skip_string()
+                continue
+            self.pos = m.end()
+            if c in '[{':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return
+
+    def skip_string(self):
+        """
+        Skip the string starting at the current position.
+        """
+        while True:
+            m = self.string.match(self.buf, self.pos)
+            if m:
+                self.pos = m.end()
+                return
+            self.more()
+
+    def more(self):
+        if not self.fill():
+            raise ValueError("Unexpected end of file")
+
+    def elements(self):
+        """
+        Yield the elements of the array at the current position. If the
+        value is not an array, yield it as the only element.
+        """
+        if self.peek() != '[':
+            yield self.decode()
+            return
+        self.expect('[')
+        if self.peek() == ']':
+            return
+        while True:
+            yield self.decode()
+            if self.expect(',]') == ']':
+                return
+
+    def values(self, key):
+        """
+        Yield the elements of the top-level array called key. If the
+        value is not an array, yield it as the only element.
+        """
+        self.expect('{')
+        if self.peek() == '}':
+            return
+        while True:
+            name = self.decode()
+            self.expect(':')
+            if name == key:
+                yield from self.elements()
+                return
+            self.skip()
+            if self.expect(',}') == '}':
+                return
+
+def merge(sequences, collection):
+    """
+    Merge the sequences of a collection from several archives into one,
+    dropping the items with an id seen before. Statuses are sorted
+    latest first and merged by date. Favourites, bookmarks and mentions
+    are stored in the order they were fetched, not by date, so they
+    follow each other, archive by archive. The sequences are only
+    consumed as far as necessary.
+    """
+    def created(item):
+        return str(item.get("created_at", "")) if item else ""
+
+    if collection == "statuses":
+        items = heapq.merge(*sequences, reverse=True, key=created)
+    else:
+        items = itertools.chain.from_iterable(sequences)
+    seen = set()
+    for item in items:
+        if item and "id" in item:
+            key = str(item["id"])
+            if key in seen:
+                continue
+            seen.add(key)
+        yield item
+
+def iter_collection(file_name, collection, combine=False, quiet=True):
+    """
+    Yield the statuses (or whatever else) in a collection one by one,
+    without loading the whole archive into memory. The statuses come in
+    the order they are stored, latest first. If combine is True, the
+    statuses of the split archives are merged into them.
+    """
+
+    if not codec.exists(file_name):
+        print("You need to create an archive, first", file=sys.stderr)
+        sys.exit(2)
+
+    if combine and collection in SPLIT_COLLECTIONS:
+        # the statuses of every file are sorted latest first since the
+        # archive, split and convert commands write them that way; they
+        # aren't sorted again here because that means reading them all
+        yield from merge([iter_archive(archive, collection, quiet)
+                          for archive in [file_name] + split_archives(file_name)],
+                         collection)
+    else:
+        yield from iter_archive(file_name, collection, quiet)
+
+def iter_archive(file_name, collection, quiet=True):
+    """
+    Yield the statuses (or whatever else) in a collection of a single
+    archive file.
+    """
+    if os.path.getsize(codec.resolve(file_name)) == 0:
+        return
+    if not quiet:
+        print("Reading archive:", codec.resolve(file_name))
+    layout = archive_layout(file_name)
+    if layout == "folder":
+        yield from folder.iter_collection(file_name, collection)
+        return
+    elif layout == "sqlite":
+        yield from database.iter_collection(file_name, collection)
+        return
+    fp = None if snapshot.enabled else codec.open_text(file_name)
+    if fp is not None:
+        with fp:
+            scanner = Scanner(fp)
+            scanner.fill()
+            if not normalize.header.match(scanner.buf):
+                yield from journal.overlay(file_name, collection,
+                                           scanner.values(collection))
+                return
+    # binary codecs, snapshots and normalized archives cannot be
+    # streamed; the next collection comes from the same data
+    value = read_archive(file_name, shared=True).get(collection, [])
+    yield from value if isinstance(value, list) else [value]
+
+def load_account(file_name):
+    """
+    Return the account stored in an archive without loading the rest.
+    """
+    for account in iter_collection(file_name, "account"):
+        return account
+    return None
+
+def pagination(page, direction):
+    """
+    Return the pagination information of a page for the direction
+    "prev" or "next", or None. Mastodon.py 2 keeps it on the page,
+    older versions on the first and the last item.
+    """
+    if not page:
+        return None
+    key = "_pagination_" + direction
+    info = getattr(page, key, None)
+    item = page[0] if direction == "prev" else page[-1]
+    if info is None and isinstance(item, dict):
+        info = item.get(key)
+    return info or None
+
+def cursor(page):
+    """
+    Return the parameters to get what's newer than a page from
+    Mastodon, or None.
+    """
+    info = pagination(page, "prev")
+    if not info:
+        return None
+    result = {key: str(value) for key, value in dict(info).items()
+              if key in ("min_id", "since_id") and value is not None}
+    return result or None
+
 def date_handler(obj):
     return(obj.isoformat()
            if isinstance(obj, (datetime.datetime, datetime.date))
            else None)
 
-def save(file_name, data, quiet=False, backup=True):
+def make_backup(file_name, quiet=False):
+    """
+    Copy the file to a backup file, asking before overwriting an
+    existing backup unless overwrite_backups is set.
+    """
+    backup_file = file_name + '~'
+    if not quiet:
+        print("Backing up", file_name, "to", backup_file)
+    if os.path.isfile(backup_file):
+        ans = "yes" if overwrite_backups else ""
+        while ans.lower() not in ("y", "n", "yes", "no"):
+            ans = input(
+                "Backup: {} exists! Overwrite (yes/no)? ".format(backup_file)
+            )
+
+        if ans.lower()[0] == "y":
+            shutil.copy2(file_name, backup_file)
+        else:
+            print("Exiting to avoid overwriting backup.", file=sys.stderr)
+            sys.exit(0)
+
+def save(file_name, data, quiet=False, backup=True, layout=None,
+         changes=None, codec_name=None):
     """
     Save the JSON data in a file. If the file exists, rename it,
-    in case backup is True (the default).
+    in case backup is True (the default). The archive keeps its
+    layout and codec unless different ones are given. If you
+    recorded the changes you made, these are appended to the
+    journal instead, until the journal gets too big and the file is
+    rewritten.
     """
-    if backup and os.path.isfile(file_name):
-        backup_file = file_name + '~'
+    if layout is None:
+        layout = archive_layout(file_name)
+
+    if layout == "folder":
+        folder.save(file_name, data, quiet=quiet, backup=backup)
+        return
+    elif layout == "sqlite":
+        # no backup: all the changes are saved in a single transaction
+        database.save(file_name, data, quiet=quiet)
+        return
+
+    if (changes is not None and layout == "json"
+        and not journal.needs_compaction(file_name)):
         if not quiet:
-            print("Backing up", file_name, "to", backup_file)
-        if os.path.isfile(backup_file):
-            ans = ""
-            while ans.lower() not in ("y", "n", "yes", "no"):
-                ans = input(
-                    "Backup: {} exists! Overwrite (yes/no)? ".format(backup_file)
-                )
+            print("Appending changes to", journal.journal_file(file_name))
+        journal.append(file_name, data, changes, default=date_handler)
+        changes.clear()
+        return
 
-            if ans.lower()[0] == "y":
-                shutil.copy2(file_name, backup_file)
-            else:
-                print("Exiting to avoid overwriting backup.", file=sys.stderr)
-                sys.exit(0)
+    old_codec = codec.archive_codec(file_name)
+    if codec_name is None:
+        codec_name = old_codec or "json"
+
+    if backup and old_codec:
+        make_backup(codec.resolve(file_name), quiet)
+
+    codec.write(file_name, normalize.compact(dict(data)), codec_name,
+                default = date_handler)
+    codec.remove_others(file_name, codec_name)
 
-    with open(file_name, mode = 'w', encoding = 'utf-8') as fp:
-        data = json.dump(data, fp, indent = 2, default = date_handler)
+    # the journal is part of the file, now
+    journal.remove(file_name)
+    if changes is not None:
+        changes.clear()
 
 def all_accounts():
     """
     Return all the known user accounts in the current directory.
     """
-    archives = glob.glob('*.user.*.json');
+    archives = [archive for archive in glob.glob('*.user.*')
+                if re.search(r"\.(json|json\.gz|json\.zst|msgpack)$", archive)]
     if not archives:
         print("You need to create an archive, first", file=sys.stderr)
         sys.exit(2)
     else:
         users = []
         for archive in archives:
-            m = re.match(r"(.*)\.user\.(.*?)(?:\.\d+)?\.json", archive)
+            m = re.match(r"(.*)\.user\.(.*?)(?:\.\d+)?\.(?:json|msgpack)", archive)
             if m:
                 user = "%s@%s" % m.group(2, 1)
                 if user not in users:
                     users.append("%s@%s" % m.group(2, 1))
         return users
 
+def run_all(args):
+    """
+    Run the command for all the known user accounts, several at the
+    same time. Accounts on the same instance are run one after another
+    by the same process so that they don't compete for its rate limit.
+    Return the first exit code that isn't zero.
+    """
+    domains = {}
+    for user in all_accounts():
+        domains.setdefault(user.split("@")[1], []).append(user)
+    result = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.parallel) as executor:
+        futures = [executor.submit(run_accounts, args, users)
+                   for users in domains.values()]
+        for future in concurrent.futures.as_completed(futures):
+            results, counted = future.result()
+            metrics.merge(counted)
+            for user, output, code in results:
+                print(user)
+                print(output, end="", flush=True)
+                result = result or code
+    return result
+
+def run_accounts(args, users):
+    """
+    Run the command for some accounts, one after another, and return
+    what each of them printed and its exit code, and the metrics.
+    """
+    global jobs, overwrite_backups
+    # in case the process was spawned instead of forked
+    snapshot.enabled = args.cache
+    jobs = args.jobs
+    # the output is only printed once the account is done and there is
+    # no input, so asking about backups would fail
+    overwrite_backups = True
+    connection.record = args.record
+    connection.replay = args.replay
+    connection.replay_speed = args.replay_speed
+    # the process may have run other accounts before
+    metrics.take()
+    results = []
+    for user in users:
+        args.user = user
+        output = io.StringIO()
+        code = 0
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+            try:
+                args.command(args)
+            except SystemExit as e:
+                code = e.code
+            except Exception:
+                traceback.print_exc()
+                code = 1
+        # the next account on the same instance starts from here; the
+        # workers for other instances write to the same file, so this
+        # happens while holding its lock
+        ratelimit.store()
+        results.append((user, output.getvalue(), code))
+    return results, metrics.take()
+
 def keep(statuses, weeks):
     """
     Return all statuses newer than some weeks
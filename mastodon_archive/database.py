@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026  Alex Schroeder <alex@gnu.org>
+
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+# In the sqlite layout, the archive file is a small manifest listing the
+# collections, just like in the folder layout, and the collections are
+# stored in an SQLite database next to it:
+#
+# example.org.user.alex.json
+# example.org.user.alex.sqlite
+#
+# Every item of a collection is a row with its raw JSON and some indexed
+# columns. For boosts, in_reply_to_id, uri and url are the ones of the
+# boosted status since that's the one we're usually looking for. Values
+# that aren't lists, such as the account, are stored as they are.
+
+import json
+import os
+import re
+import sqlite3
+from . import core
+from . import folder
+
+schema = '''
+CREATE TABLE IF NOT EXISTS items (
+    collection TEXT NOT NULL,
+    id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    created_at TEXT,
+    reblog_id TEXT,
+    in_reply_to_id TEXT,
+    uri TEXT,
+    url TEXT,
+    json TEXT NOT NULL,
+    PRIMARY KEY (collection, id)
+);
+CREATE INDEX IF NOT EXISTS items_position ON items (collection, position);
+CREATE INDEX IF NOT EXISTS items_created_at ON items (collection, created_at);
+CREATE INDEX IF NOT EXISTS items_id ON items (id);
+CREATE INDEX IF NOT EXISTS items_reblog_id ON items (reblog_id);
+CREATE INDEX IF NOT EXISTS items_in_reply_to_id ON items (in_reply_to_id);
+CREATE INDEX IF NOT EXISTS items_uri ON items (uri);
+CREATE INDEX IF NOT EXISTS items_url ON items (url);
+CREATE TABLE IF NOT EXISTS "values" (
+    name TEXT PRIMARY KEY,
+    json TEXT NOT NULL
+);
+'''
+
+def database_file(file_name):
+    """
+    Return the SQLite database of an archive.
+    """
+    return re.sub(r"\.json$", "", file_name) + ".sqlite"
+
+def connect(file_name):
+    db = sqlite3.connect(database_file(file_name))
+    db.executescript(schema)
+    return db
+
+def dumps(value):
+    return json.dumps(value, separators=(',', ':'), default=core.date_handler)
+
+def key(item, text):
+    """
+    Return the key of an item in a collection: its id, or its JSON if
+    it has no id.
+    """
+    if isinstance(item, dict) and item.get("id") is not None:
+        return str(item["id"])
+    return text
+
+def columns(item):
+    """
+    Return the values for the indexed columns of an item.
+    """
+    if not isinstance(item, dict):
+        return (None, None, None, None, None)
+    status = item.get("reblog") or item
+    reblog_id = str(item["reblog"]["id"]) if item.get("reblog") else None
+    in_reply_to_id = status.get("in_reply_to_id")
+    if in_reply_to_id is not None:
+        in_reply_to_id = str(in_reply_to_id)
+    created_at = item.get("created_at")
+    if created_at is not None:
+        created_at = core.date_handler(created_at) or str(created_at)
+    return (created_at, reblog_id, in_reply_to_id,
+            status.get("uri"), status.get("url"))
+
+class Archive(folder.Archive):
+    """
+    An archive using the sqlite layout. A collection is only read from
+    the database when it is used.
+    """
+
+    def __init__(self, file_name, names, quiet=False, combine=False):
+        super().__init__(file_name, names, quiet, combine)
+        self.db = None
+        # for every collection read, map keys to positions and hashes
+        self.rows = {}
+
+    def read(self, name):
+        """
+        Read a collection from the database.
+        """
+        if self.db is None:
+            self.db = connect(self.file_name)
+        if not self.quiet:
+            print("Loading existing archive:", self.file_name, name)
+        row = self.db.execute('SELECT json FROM "values" WHERE name = ?',
+                              (name,)).fetchone()
+        if row:
+            self.rows[name] = hash(row[0])
+            return json.loads(row[0])
+        rows = {}
+        value = []
+        for id, position, text in self.db.execute(
+                'SELECT id, position, json FROM items '
+                'WHERE collection = ? ORDER BY position', (name,)):
+            rows[id] = (position, hash(text))
+            value.append(json.loads(text))
+        self.rows[name] = rows
+        return value
+
+def load(file_name, quiet=False, combine=False):
+    """
+    Return an archive using the sqlite layout. Nothing but the manifest
+    is read until a collection is used.
+    """
+    manifest = folder.read_manifest(file_name)
+    return Archive(file_name, manifest["collections"], quiet, combine)
+
+def iter_collection(file_name, name):
+    """
+    Yield the items of one collection of an archive using the sqlite
+    layout.
+    """
+    db = connect(file_name)
+    try:
+        row = db.execute('SELECT json FROM "values" WHERE name = ?',
+                         (name,)).fetchone()
+        if row:
+            yield json.loads(row[0])
+            return
+        for (text,) in db.execute('SELECT json FROM items WHERE collection = ? '
+                                  'ORDER BY position', (name,)):
+            yield json.loads(text)
+    finally:
+        db.close()
+
+def read_rows(db, name):
+    """
+    Return the positions and hashes of the items in a collection.
+    """
+    return {id: (position, hash(text)) for id, position, text in db.execute(
+        'SELECT id, position, json FROM items WHERE collection = ?', (name,))}
+
+def save_items(db, name, items, old):
+    """
+    Insert, update and delete the rows of a collection so that they
+    match the items. Rows that haven't changed are left alone. The
+    positions and hashes in old are updated.
+    """
+    texts = {}
+    keys = []
+    for item in items:
+        text = dumps(item)
+        k = key(item, text)
+        # only keep the first of duplicates
+        if k not in texts:
+            texts[k] = (item, text)
+            keys.append(k)
+
+    # New items are usually added at the front, and combining split
+    # archives adds older items at the back. If that's all that happened,
+    # existing rows keep their positions. Otherwise, all the rows are
+    # renumbered.
+    front = 0
+    while front < len(keys) and keys[front] not in old:
+        front += 1
+    back = len(keys)
+    while back > front and keys[back - 1] not in old:
+        back -= 1
+    positions = [old[k][0] if k in old else None for k in keys[front:back]]
+    if (None not in positions
+        and all(a < b for a, b in zip(positions, positions[1:]))):
+        first = min((position for position, h in old.values()), default=0)
+        last = max((position for position, h in old.values()), default=0)
+        new_positions = {k: first - front + i
+                         for i, k in enumerate(keys[:front])}
+        new_positions.update({k: last + 1 + i
+                              for i, k in enumerate(keys[back:])})
+    else:
+        new_positions = {k: i for i, k in enumerate(keys)}
+
+    inserted = updated = 0
+    for k in keys:
+        item, text = texts[k]
+        position = new_positions.get(k)
+        if k in old:
+            if position is None:
+                position = old[k][0]
+            if old[k] == (position, hash(text)):
+                continue
+            db.execute('UPDATE items SET position = ?, created_at = ?, '
+                       'reblog_id = ?, in_reply_to_id = ?, uri = ?, url = ?, '
+                       'json = ? WHERE collection = ? AND id = ?',
+                       (position, *columns(item), text, name, k))
+            updated += 1
+        else:
+            db.execute('INSERT INTO items (collection, id, position, '
+                       'created_at, reblog_id, in_reply_to_id, uri, url, json) '
+                       'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                       (name, k, position, *columns(item), text))
+            inserted += 1
+        old[k] = (position, hash(text))
+
+    deleted = [k for k in old if k not in texts]
+    db.executemany('DELETE FROM items WHERE collection = ? AND id = ?',
+                   [(name, k) for k in deleted])
+    for k in deleted:
+        del old[k]
+
+    return inserted, updated, len(deleted)
+
+def save(file_name, data, quiet=False):
+    """
+    Save an archive using the sqlite layout. Collections that haven't
+    been read are not touched and only the rows that changed are
+    written. All the changes are written in a single transaction.
+    """
+    old_names = []
+    if core.archive_layout(file_name) == "sqlite":
+        old_names = folder.read_manifest(file_name)["collections"]
+
+    if isinstance(data, Archive) and data.file_name == file_name:
+        items = data.loaded.items()
+        rows = data.rows
+    else:
+        items = data.items()
+        rows = {}
+
+    db = connect(file_name)
+    with db:
+        for name, value in items:
+            if isinstance(value, list):
+                old = rows.get(name)
+                if not isinstance(old, dict):
+                    old = read_rows(db, name)
+                db.execute('DELETE FROM "values" WHERE name = ?', (name,))
+                inserted, updated, deleted = save_items(db, name, value, old)
+                rows[name] = old
+                if not quiet and inserted + updated + deleted:
+                    print("Saving %s: %d new, %d changed, %d removed" % (
+                        name, inserted, updated, deleted))
+            else:
+                text = dumps(value)
+                if rows.get(name) == hash(text):
+                    continue
+                db.execute('DELETE FROM items WHERE collection = ?', (name,))
+                db.execute('INSERT OR REPLACE INTO "values" (name, json) '
+                           'VALUES (?, ?)', (name, text))
+                rows[name] = hash(text)
+
+        names = list(data.keys())
+        for name in old_names:
+            if name not in names:
+                db.execute('DELETE FROM items WHERE collection = ?', (name,))
+                db.execute('DELETE FROM "values" WHERE name = ?', (name,))
+    db.close()
+
+    if names != old_names:
+        folder.write_manifest(file_name, names, layout="sqlite")
+
+def remove(file_name):
+    """
+    Remove the database of an archive that no longer uses the sqlite
+    layout.
+    """
+    if os.path.isfile(database_file(file_name)):
+        os.remove(database_file(file_name))
+
+def query(file_name, sql, parameters=()):
+    """
+    Yield the decoded JSON of the items matching a query, which must
+    select the json column first.
+    """
+    db = connect(file_name)
+    try:
+        for row in db.execute(sql, parameters):
+            yield json.loads(row[0])
+    finally:
+        db.close()
+
+def statuses(file_name, where, parameters=(),
+             collections=("statuses", "favourites", "bookmarks", "mentions")):
+    """
+    Yield the statuses matching a condition on the indexed columns, in
+    the order of the collections given. Boosts are replaced by the
+    boosted statuses.
+    """
+    order = " ".join("WHEN ? THEN %d" % i for i in range(len(collections)))
+    sql = ('SELECT json FROM items WHERE collection IN (%s) AND (%s) '
+           'ORDER BY CASE collection %s END, position' % (
+               ", ".join("?" for c in collections), where, order))
+    for item in query(file_name, sql, (*collections, *parameters, *collections)):
+        yield item.get("reblog") or item
+
+def missing_replies(file_name):
+    """
+    Return the ids of the statuses you replied to which are not in the
+    archive.
+    """
+    collections = ("statuses", "favourites", "bookmarks", "mentions", "replies")
+    db = connect(file_name)
+    try:
+        return [row[0] for row in db.execute(
+            'SELECT DISTINCT s.in_reply_to_id FROM items AS s '
+            'WHERE s.collection = ? AND s.reblog_id IS NULL '
+            'AND s.in_reply_to_id IS NOT NULL AND NOT EXISTS ('
+            ' SELECT 1 FROM items AS i WHERE i.collection IN (?, ?, ?, ?, ?)'
+            ' AND (i.reblog_id = s.in_reply_to_id'
+            '  OR i.id = s.in_reply_to_id AND i.reblog_id IS NULL))',
+            ("statuses", *collections))]
+    finally:
+        db.close()
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026  Alex Schroeder <alex@gnu.org>
+
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+# With --async, the archive and replies commands don't use Mastodon.py
+# to talk to your instance but this engine, based on asyncio and
+# aiohttp. It implements just the endpoints these commands need and
+# keeps several requests on their way at the same time, which helps a
+# lot if your instance is far away. Mastodon.py is still used to log in.
+#
+# The engine runs an event loop in a thread of its own. Its methods can
+# be called like the methods of Mastodon.py from any thread and wait for
+# the result. fetch_statuses gets many statuses at the same time.
+#
+# The engine returns what Mastodon.py returns so that an archive can be
+# continued with or without --async: ids are numbers, dates are parsed,
+# and pages are lists with the pagination information in the same
+# format, _pagination_next and _pagination_prev having the parameters
+# for the next and previous page, including _pagination_method and
+# _pagination_endpoint.
+
+import asyncio
+import atexit
+import copy
+import datetime
+import json
+import re
+import sys
+import threading
+import time
+import urllib.parse
+import dateutil.parser
+from mastodon.errors import (MastodonAPIError, MastodonError,
+                             MastodonNotFoundError, MastodonNetworkError,
+                             MastodonServerError)
+from . import checkpoint
+from . import metrics
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# the number of requests on their way at the same time
+CONNECTIONS = 8
+
+# the fields Mastodon.py turns into numbers, dates and booleans
+NUMBER_FIELDS = ["id", "week", "in_reply_to_id", "in_reply_to_account_id",
+                 "logins", "registrations", "statuses", "day", "last_read_id",
+                 "value", "frequency", "rate", "invited_by_account_id", "count"]
+DATE_FIELDS = ["created_at", "week", "day", "expires_at", "scheduled_at",
+               "updated_at", "last_status_at", "starts_at", "ends_at",
+               "published_at", "edited_at", "date", "period"]
+BOOLEAN_FIELDS = ["follow", "favourite", "reblog", "mention", "confirmed",
+                  "suspended", "silenced", "disabled", "approved", "all_day"]
+
+def check():
+    """
+    Exit if aiohttp is not installed.
+    """
+    if aiohttp is None:
+        print("The async engine needs the aiohttp module: pip install aiohttp",
+              file=sys.stderr)
+        sys.exit(5)
+
+class AttribAccessDict(dict):
+    """
+    A dict whose keys can be used as attributes, as in Mastodon.py.
+    """
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+class Page(list):
+    """
+    A list of items with the pagination information.
+    """
+    _pagination_next = None
+    _pagination_prev = None
+
+def wrap(data):
+    """
+    Convert a JSON object like the JSON hooks of Mastodon.py do: ids
+    and counts become numbers, known dates are parsed (and dropped if
+    they can't be), and "true" and "false" become booleans. Use it as
+    the object_hook of json.loads.
+    """
+    for key in NUMBER_FIELDS:
+        if isinstance(data.get(key), str):
+            try:
+                data[key] = int(data[key])
+            except ValueError:
+                pass
+    for key in DATE_FIELDS:
+        if data.get(key) is not None:
+            try:
+                if isinstance(data[key], int):
+                    data[key] = datetime.datetime.fromtimestamp(
+                        data[key], datetime.timezone.utc)
+                else:
+                    data[key] = dateutil.parser.parse(data[key])
+            except Exception:
+                del data[key]
+    for key in BOOLEAN_FIELDS:
+        if isinstance(data.get(key), str):
+            if data[key].lower() == "true":
+                data[key] = True
+            elif data[key].lower() == "false":
+                data[key] = False
+    return AttribAccessDict(data)
+
+def parameters(params):
+    """
+    Return the parameters of a request as Mastodon.py has them: without
+    None and the keys starting with an underscore, "1" and "0" for
+    booleans, and "[]" added to the keys of lists.
+    """
+    result = {}
+    for key, value in params.items():
+        if value is None or key.startswith("_"):
+            continue
+        if isinstance(value, bool):
+            value = "1" if value else "0"
+        if isinstance(value, (list, tuple)):
+            value = list(value)
+            if not key.endswith("[]"):
+                key += "[]"
+        result[key] = value
+    return result
+
+def query(params):
+    """
+    Return the parameters of a request for aiohttp, repeating list
+    values.
+    """
+    result = []
+    for key, value in params.items():
+        if isinstance(value, list):
+            result.extend((key, str(v)) for v in value)
+        else:
+            result.append((key, str(value)))
+    return result
+
+def pagination(url, params, path, keys):
+    """
+    Return the pagination information for a link, as Mastodon.py does:
+    the parameters of the request with the id from the link given for
+    the first of the keys found in it.
+    """
+    for key in keys:
+        m = re.search(r"[?&]%s=([^&]+)" % key, url)
+        if m:
+            info = copy.deepcopy(params)
+            info["_pagination_method"] = "GET"
+            info["_pagination_endpoint"] = path
+            for other in ("max_id", "min_id", "since_id"):
+                info.pop(other, None)
+            value = m.group(1)
+            info[key] = int(value) if value.isdigit() else value
+            return info
+    return None
+
+class Engine:
+    """
+    Talk to a Mastodon instance using asyncio.
+    """
+
+    def __init__(self, api_base_url, access_token, connections=CONNECTIONS):
+        check()
+        self.api_base_url = api_base_url.rstrip("/")
+        self.host = urllib.parse.urlsplit(self.api_base_url).netloc
+        self.access_token = access_token
+        self.connections = connections
+        # updated from the X-RateLimit headers, as in Mastodon.py
+        self.ratelimit_limit = None
+        self.ratelimit_remaining = None
+        self.ratelimit_reset = None
+        self.next_call = 0
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self.run(self.open())
+        atexit.register(self.close)
+
+    def run(self, coroutine):
+        """
+        Run a coroutine on the event loop and return its result.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    async def open(self):
+        self.session = aiohttp.ClientSession(
+            headers={"Authorization": "Bearer " + self.access_token,
+                     "User-Agent": "Mastodon-Archive/1.3 "
+                     "(+https://github.com/kensanata/mastodon-archive#mastodon-archive)"},
+            connector=aiohttp.TCPConnector(limit_per_host=self.connections),
+            timeout=aiohttp.ClientTimeout(total=300))
+        self.semaphore = asyncio.Semaphore(self.connections)
+        self.lock = asyncio.Lock()
+
+    def close(self):
+        if not self.session.closed:
+            self.run(self.session.close())
+
+    async def pace(self):
+        """
+        Wait until the next request may start so that the requests left
+        last until the rate limit resets.
+        """
+        async with self.lock:
+            now = time.time()
+            if self.next_call > now:
+                await self.sleep(self.next_call - now)
+                now = time.time()
+            remaining = self.ratelimit_remaining
+            reset = self.ratelimit_reset
+            if remaining is None or reset is None or reset <= now:
+                return
+            if remaining <= 0:
+                await self.sleep(reset - now)
+                return
+            self.next_call = now + (reset - now) / remaining
+            # until the response tells us better
+            self.ratelimit_remaining = remaining - 1
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(seconds)
+        metrics.waited(self.host, seconds)
+
+    def update(self, headers):
+        """
+        Update the rate limit from the headers of a response.
+        """
+        try:
+            if "X-RateLimit-Limit" in headers:
+                self.ratelimit_limit = int(headers["X-RateLimit-Limit"])
+            if "X-RateLimit-Remaining" in headers:
+                self.ratelimit_remaining = int(headers["X-RateLimit-Remaining"])
+            if "X-RateLimit-Reset" in headers:
+                reset = headers["X-RateLimit-Reset"].replace("Z", "+00:00")
+                self.ratelimit_reset = datetime.datetime.fromisoformat(reset).timestamp()
+        except ValueError:
+            pass
+
+    async def request(self, path, params=None):
+        """
+        Return the data and the response of a GET request, trying again
+        after server errors, network errors and rate limiting.
+        """
+        url = self.api_base_url + path
+        params = query(params)
+        full_url = url + "?" + urllib.parse.urlencode(params) if params else url
+        for delay in checkpoint.DELAYS + [None]:
+            async with self.semaphore:
+                await self.pace()
+                start = time.monotonic()
+                try:
+                    async with self.session.get(url, params=params) as response:
+                        body = await response.read()
+                        metrics.request("GET", full_url, time.monotonic() - start,
+                                        response.status, len(body))
+                        self.update(response.headers)
+                        if response.status == 429:
+                            # pace() waits until the reset, if we know it
+                            self.ratelimit_remaining = 0
+                            error = MastodonAPIError(
+                                "Mastodon API returned error", 429,
+                                response.reason, None)
+                        elif response.status < 500:
+                            text = await response.text()
+                            if response.status == 404:
+                                raise MastodonNotFoundError(
+                                    "Mastodon API returned error", 404,
+                                    "Not Found", text)
+                            if response.status >= 400:
+                                raise MastodonAPIError(
+                                    "Mastodon API returned error",
+                                    response.status, response.reason, text)
+                            return json.loads(body, object_hook=wrap), response
+                        else:
+                            error = MastodonServerError(
+                                "Mastodon API returned error", response.status,
+                                response.reason, None)
+                except aiohttp.ClientError as e:
+                    metrics.request("GET", full_url, time.monotonic() - start)
+                    error = MastodonNetworkError("Could not complete request: %s" % e)
+            if delay is None:
+                raise error
+            await asyncio.sleep(delay)
+
+    async def get(self, path, params=None):
+        params = parameters(params or {})
+        data, response = await self.request(path, params)
+        if not isinstance(data, list):
+            return data
+        page = Page(data)
+        if "next" in response.links:
+            page._pagination_next = pagination(
+                str(response.links["next"]["url"]), params, path, ["max_id"])
+        if "prev" in response.links:
+            # newer instances use min_id, older ones since_id
+            page._pagination_prev = pagination(
+                str(response.links["prev"]["url"]), params, path,
+                ["min_id", "since_id"])
+        return page
+
+    async def get_statuses(self, ids):
+        async def get(id):
+            try:
+                return await self.get("/api/v1/statuses/%s" % id)
+            except MastodonNotFoundError:
+                return None
+            except MastodonError as e:
+                # one status we can't get shouldn't stop the others
+                return e
+        return await asyncio.gather(*(get(id) for id in ids))
+
+    # The endpoints, named and used like their counterparts in Mastodon.py
+
+    def account_verify_credentials(self):
+        return self.run(self.get("/api/v1/accounts/verify_credentials"))
+
+    def account_statuses(self, id, **params):
+        return self.run(self.get("/api/v1/accounts/%s/statuses" % id, params))
+
+    def favourites(self, **params):
+        return self.run(self.get("/api/v1/favourites", params))
+
+    def bookmarks(self, **params):
+        return self.run(self.get("/api/v1/bookmarks", params))
+
+    def notifications(self, **params):
+        return self.run(self.get("/api/v1/notifications", params))
+
+    def status(self, id):
+        return self.run(self.get("/api/v1/statuses/%s" % id))
+
+    def fetch_statuses(self, ids):
+        """
+        Return the statuses for the ids, None for the ones not found,
+        and the error for the ones we couldn't get.
+        """
+        return self.run(self.get_statuses(ids))
+
+    def account_relationships(self, ids):
+        return self.run(self.get("/api/v1/accounts/relationships",
+                                 {"id[]": list(ids)}))
+
+    def account_followers(self, id, **params):
+        return self.run(self.get("/api/v1/accounts/%s/followers" % id, params))
+
+    def account_following(self, id, **params):
+        return self.run(self.get("/api/v1/accounts/%s/following" % id, params))
+
+    def mutes(self, **params):
+        return self.run(self.get("/api/v1/mutes", params))
+
+    def blocks(self, **params):
+        return self.run(self.get("/api/v1/blocks", params))
+
+    def fetch_page(self, page, direction):
+        info = page if isinstance(page, dict) else getattr(page, "_pagination_" + direction, None)
+        if not info:
+            return None
+        return self.run(self.get(info["_pagination_endpoint"], info))
+
+    def fetch_next(self, page):
+        return self.fetch_page(page, "next")
+
+    def fetch_previous(self, page):
+        return self.fetch_page(page, "prev")
+
+    def fetch_remaining(self, first_page):
+        result = list(first_page)
+        page = first_page
+        while page:
+            page = self.fetch_next(page)
+            if page:
+                result.extend(page)
+        return result
@@ -23,7 +23,9 @@ from random import shuffle
 import signal
 import html2text
 import textwrap
+from . import archive
 from . import core
+from . import journal
 
 h = html2text.HTML2Text()
 h.ignore_links = True
@@ -105,9 +107,12 @@ def expire(args):
             bar = Bar('Expiring', max = len(statuses))
             error = ''
 
+            # only the statuses marked as deleted need saving
+            changes = journal.Changes()
+
             def signal_handler(signal, frame):
                 print("\nYou pressed Ctrl+C! Saving data before exiting!")
-                core.save(status_file, data)
+                core.save(status_file, data, changes=changes)
                 sys.exit(0)
 
             signal.signal(signal.SIGINT, signal_handler)
@@ -116,8 +121,10 @@ def expire(args):
             for status in statuses:
                 try:
                     delete(mastodon, collection, status)
+                    changes.updated(collection, status)
                     if i % 300 == 0:
-                        core.save(status_file, data, quiet=True, backup=False)
+                        core.save(status_file, data, quiet=True, backup=False,
+                                  changes=changes)
                     i = i+1
                     bar.next()
                 except Exception as e:
@@ -127,8 +134,10 @@ def expire(args):
                         mastodon = core.readwrite(args)
                         # retry
                         delete(mastodon, collection, status)
+                        changes.updated(collection, status)
                     elif "not found" in str(e):
                         status["deleted"] = True
+                        changes.updated(collection, status)
                         bar.next()
                     elif "Name or service not known" in str(e):
                         error = "Error: the instance name is either misspelled or offline"
@@ -140,7 +149,7 @@ def expire(args):
             if error:
                 print(error, file=sys.stderr)
 
-            core.save(status_file, data, quiet=args.quiet)
+            core.save(status_file, data, quiet=args.quiet, changes=changes)
 
         elif n_statuses > 0:
 
@@ -184,7 +193,11 @@ def expire(args):
                     and x["created_at"].replace(tzinfo = None) < cutoff]
 
         mastodon = core.login(args)
-        notifications = mastodon.notifications(limit=100)
+        if delete_others:
+            notifications = mastodon.notifications(limit=100)
+        else:
+            notifications = mastodon.notifications(
+                limit=100, exclude_types=archive.OTHER_NOTIFICATIONS)
         error = ''
         total = 0
         dismissed = 0
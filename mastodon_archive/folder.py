@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026  Alex Schroeder <alex@gnu.org>
+
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+# In the folder layout, the archive file is a small manifest listing the
+# collections, and every collection is stored in its own JSON file in a
+# folder next to it:
+#
+# example.org.user.alex.json
+# example.org.user.alex.collections/account.json
+# example.org.user.alex.collections/statuses.json
+# ...
+
+import collections.abc
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+from . import core
+
+def directory(file_name):
+    """
+    Return the folder holding the collection files of an archive.
+    """
+    return re.sub(r"\.json$", "", file_name) + ".collections"
+
+def collection_file(file_name, name):
+    """
+    Return the file holding one collection of an archive.
+    """
+    return os.path.join(directory(file_name), name + ".json")
+
+def read_manifest(file_name):
+    with open(file_name, mode='r', encoding='utf-8') as fp:
+        return json.load(fp)
+
+def write_manifest(file_name, names, layout="folder"):
+    manifest = {
+        "layout": layout,
+        "collections": names,
+    }
+    with open(file_name, mode='w', encoding='utf-8') as fp:
+        json.dump(manifest, fp, indent=2)
+
+def digest(chunks):
+    """
+    Return the SHA-1 hex digest of some strings or bytes.
+    """
+    sha1 = hashlib.sha1()
+    for chunk in chunks:
+        sha1.update(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+    return sha1.hexdigest()
+
+def file_digest(file_name):
+    with open(file_name, mode='rb') as fp:
+        return digest(iter(lambda: fp.read(1 << 16), b''))
+
+def encode(value):
+    """
+    Return the chunks of the JSON text for a collection, formatted like
+    the single file archive.
+    """
+    encoder = json.JSONEncoder(indent=2, default=core.date_handler)
+    return encoder.iterencode(value)
+
+class Archive(collections.abc.MutableMapping):
+    """
+    An archive using the folder layout. It behaves like the dict you get
+    from a single JSON file but a collection is only read from disk when
+    it is used.
+    """
+
+    def __init__(self, file_name, names, quiet=False, combine=False):
+        self.file_name = file_name
+        self.names = list(names)
+        self.quiet = quiet
+        self.combine = combine
+        # the collections read or set so far
+        self.loaded = {}
+        # the digests of the collection files as they were read
+        self.digests = {}
+        # Bookmarks are a recent addition so older archives don't have any
+        if "bookmarks" not in self.names:
+            self.loaded["bookmarks"] = []
+
+    def __getitem__(self, name):
+        if name not in self.loaded:
+            if name not in self.names:
+                raise KeyError(name)
+            value = self.read(name)
+            if name == "statuses":
+                value.sort(key=lambda x: x["created_at"], reverse=True)
+            if self.combine and name in core.SPLIT_COLLECTIONS:
+                value = list(core.merge(
+                    [value] + [core.iter_collection(archive, name,
+                                                    quiet=self.quiet)
+                               for archive in core.split_archives(self.file_name)],
+                    name))
+            self.loaded[name] = value
+        return self.loaded[name]
+
+    def __setitem__(self, name, value):
+        self.loaded[name] = value
+
+    def __delitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+        self.loaded.pop(name, None)
+        if name in self.names:
+            self.names.remove(name)
+
+    def __contains__(self, name):
+        return name in self.loaded or name in self.names
+
+    def __iter__(self):
+        yield from self.names
+        yield from (name for name in self.loaded if name not in self.names)
+
+    def __len__(self):
+        return len(set(self.names) | set(self.loaded))
+
+    def read(self, name):
+        """
+        Read a collection from its file.
+        """
+        file_name = collection_file(self.file_name, name)
+        if not self.quiet:
+            print("Loading existing archive:", file_name)
+        with open(file_name, mode='rb') as fp:
+            raw = fp.read()
+        self.digests[name] = digest([raw])
+        return json.loads(raw)
+
+def load(file_name, quiet=False, combine=False):
+    """
+    Return an archive using the folder layout. Nothing but the manifest
+    is read until a collection is used.
+    """
+    manifest = read_manifest(file_name)
+    if combine and not quiet and not core.split_archives(file_name):
+        print("Warning: No split archives to combine", file=sys.stderr)
+    return Archive(file_name, manifest["collections"], quiet, combine)
+
+def iter_collection(file_name, name):
+    """
+    Yield the items of one collection of an archive using the folder
+    layout.
+    """
+    if name not in read_manifest(file_name)["collections"]:
+        return
+    with open(collection_file(file_name, name),
+              mode='r', encoding='utf-8') as fp:
+        yield from core.Scanner(fp).elements()
+
+def save(file_name, data, quiet=False, backup=True):
+    """
+    Save an archive using the folder layout. Collections that haven't
+    been read and collections that haven't changed are not written.
+    """
+    os.makedirs(directory(file_name), exist_ok=True)
+
+    old_names = []
+    if core.archive_layout(file_name) == "folder":
+        old_names = read_manifest(file_name)["collections"]
+
+    if isinstance(data, Archive) and data.file_name == file_name:
+        items = data.loaded.items()
+        digests = data.digests
+    else:
+        items = data.items()
+        digests = {}
+
+    for name, value in items:
+        path = collection_file(file_name, name)
+        if name not in digests and os.path.isfile(path):
+            digests[name] = file_digest(path)
+        new_digest = digest(encode(value))
+        if digests.get(name) == new_digest:
+            continue
+        if backup and os.path.isfile(path):
+            core.make_backup(path, quiet)
+        if not quiet:
+            print("Saving", path)
+        with open(path, mode='w', encoding='utf-8') as fp:
+            for chunk in encode(value):
+                fp.write(chunk)
+        digests[name] = new_digest
+
+    names = list(data.keys())
+    for name in old_names:
+        if name not in names:
+            os.remove(collection_file(file_name, name))
+
+    if names != old_names:
+        if backup and os.path.isfile(file_name) and not old_names:
+            core.make_backup(file_name, quiet)
+        write_manifest(file_name, names)
+
+def remove(file_name):
+    """
+    Remove the collection files of an archive that no longer uses the
+    folder layout.
+    """
+    if os.path.isdir(directory(file_name)):
+        shutil.rmtree(directory(file_name))
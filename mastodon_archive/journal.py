@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026  Alex Schroeder <alex@gnu.org>
+
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+# Rewriting a big JSON archive just to add a few statuses or to mark a few
+# of them as deleted takes a long time. Instead, these changes can be
+# appended to a journal next to the archive, one JSON object per line:
+#
+# example.org.user.alex.json
+# example.org.user.alex.json.journal
+#
+# Every save appends a batch of lines sharing the same "batch" number. A
+# line either replaces a whole collection ("value"), adds an item at a
+# position ("position" and "item"), or replaces the item with the same id
+# ("item"). When the archive is loaded, the journal is applied. When the
+# journal gets too big, the archive is written in full and the journal is
+# removed. This is called compaction.
+
+import json
+import os
+import time
+from . import codec
+
+# compact when the journal is bigger than this fraction of the archive
+compact_ratio = 0.25
+
+class Changes:
+    """
+    The changes made to a loaded archive, so that they can be appended
+    to the journal instead of saving the whole archive.
+    """
+
+    def __init__(self):
+        self.entries = []
+
+    def added(self, collection, item):
+        self.entries.append((collection, "added", item))
+
+    def updated(self, collection, item):
+        self.entries.append((collection, "updated", item))
+
+    def replaced(self, collection):
+        self.entries.append((collection, "replaced", None))
+
+    def clear(self):
+        self.entries = []
+
+def journal_file(file_name):
+    return file_name + ".journal"
+
+def size(file_name):
+    """
+    Return the size of the journal of an archive.
+    """
+    path = journal_file(file_name)
+    return os.path.getsize(path) if os.path.isfile(path) else 0
+
+def needs_compaction(file_name):
+    archive = codec.resolve(file_name)
+    return size(file_name) > os.path.getsize(archive) * compact_ratio
+
+def remove(file_name):
+    path = journal_file(file_name)
+    if os.path.isfile(path):
+        os.remove(path)
+
+def append(file_name, data, changes, default=None):
+    """
+    Append a batch of changes to the journal of an archive. Items are
+    written as they are now, no matter how often they were changed.
+    """
+    batch = time.time_ns()
+    replaced = []
+    added = {}
+    updated = {}
+    for collection, kind, item in changes.entries:
+        if kind == "replaced":
+            replaced.append(collection)
+        elif kind == "added":
+            added.setdefault(collection, {})[id(item)] = item
+        else:
+            updated.setdefault(collection, {})[id(item)] = item
+
+    lines = []
+    for collection in dict.fromkeys(replaced):
+        lines.append({"batch": batch, "collection": collection,
+                      "value": data[collection]})
+    for collection, items in updated.items():
+        if collection in replaced:
+            continue
+        new = added.get(collection, {})
+        for key, item in items.items():
+            if key not in new:
+                lines.append({"batch": batch, "collection": collection,
+                              "item": item})
+    for collection, items in added.items():
+        if collection in replaced:
+            continue
+        positions = {id(item): i for i, item in enumerate(data[collection])}
+        for key, item in sorted(items.items(),
+                                key=lambda x: positions.get(x[0], -1)):
+            if key in positions:
+                lines.append({"batch": batch, "collection": collection,
+                              "position": positions[key], "item": item})
+
+    with open(journal_file(file_name), mode='a', encoding='utf-8') as fp:
+        for line in lines:
+            fp.write(json.dumps(line, default=default) + "\n")
+
+def read(file_name):
+    """
+    Return the journal entries of an archive. An incomplete last line
+    from an interrupted save is ignored.
+    """
+    entries = []
+    path = journal_file(file_name)
+    if not os.path.isfile(path):
+        return entries
+    with open(path, mode='r', encoding='utf-8') as fp:
+        for line in fp:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+    return entries
+
+def batches(entries):
+    """
+    Group the journal entries by batch.
+    """
+    result = []
+    for entry in entries:
+        if result and result[-1][0]["batch"] == entry["batch"]:
+            result[-1].append(entry)
+        else:
+            result.append([entry])
+    return result
+
+def key(item):
+    if isinstance(item, dict) and "id" in item:
+        return str(item["id"])
+    return None
+
+def insert(items, added):
+    """
+    Insert the items at their positions, where positions are ascending
+    and refer to the list after all the insertions.
+    """
+    i = 0
+    while i < len(added):
+        position = added[i][0]
+        j = i + 1
+        while j < len(added) and added[j][0] == position + j - i:
+            j += 1
+        items[position:position] = [item for p, item in added[i:j]]
+        i = j
+
+def apply(data, entries):
+    """
+    Apply the journal entries to the data loaded from the archive.
+    """
+    for batch in batches(entries):
+        indexes = {}
+        added = {}
+        for entry in batch:
+            collection = entry["collection"]
+            if "value" in entry:
+                data[collection] = entry["value"]
+            elif "position" in entry:
+                added.setdefault(collection, []).append(
+                    (entry["position"], entry["item"]))
+            else:
+                items = data.setdefault(collection, [])
+                if collection not in indexes:
+                    indexes[collection] = {key(x): x for x in items}
+                item = entry["item"]
+                old = indexes[collection].get(key(item))
+                if old is None:
+                    items.append(item)
+                else:
+                    old.clear()
+                    old.update(item)
+        for collection, new in added.items():
+            insert(data.setdefault(collection, []), new)
+
+def overlay(file_name, collection, items):
+    """
+    Apply the journal entries for one collection to a stream of items.
+    """
+    for batch in batches(read(file_name)):
+        entries = [entry for entry in batch
+                   if entry["collection"] == collection]
+        if entries:
+            items = layer(items, entries)
+    return items
+
+def layer(items, entries):
+    for entry in entries:
+        if "value" in entry:
+            value = entry["value"]
+            items = value if isinstance(value, list) else [value]
+    updated = {key(entry["item"]): entry["item"] for entry in entries
+               if "item" in entry and "position" not in entry}
+    added = sorted(((entry["position"], entry["item"]) for entry in entries
+                    if "position" in entry), key=lambda x: x[0])
+    n = 0
+    i = 0
+    for item in items:
+        while i < len(added) and added[i][0] == n:
+            yield added[i][1]
+            n += 1
+            i += 1
+        if updated:
+            item = updated.pop(key(item), item)
+        yield item
+        n += 1
+    for position, item in added[i:]:
+        yield item
+    # updates for items we didn't see
+    yield from updated.values()
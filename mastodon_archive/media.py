@@ -20,12 +20,13 @@ import os
 import sys
 import json
 import time
-import urllib.request
-from urllib.error import HTTPError
-from urllib.error import URLError
+from requests.exceptions import HTTPError
+from requests.exceptions import RequestException
 from progress.bar import Bar
 from urllib.parse import urlparse
+from . import connection
 from . import core
+from . import metrics
 
 DEFAULT_PACE = 1
 paces_file = 'host_paces.txt'
@@ -59,13 +60,13 @@ def media(args):
 
     status_file = domain + '.user.' + username + '.json'
     media_dir = domain + '.user.' + username
-    data = core.load(status_file, required=True, quiet=True, combine=args.combine)
 
     urls = {}
     preview_urls_count = 0
 
     for collection in (args.collection or args.collection_default):
-        for status in data[collection]:
+        for status in core.iter_collection(status_file, collection,
+                                           combine=args.combine):
             attachments = status["media_attachments"]
             account = status["account"]
             emojis = status["emojis"]
@@ -102,8 +103,9 @@ def media(args):
 
     # these two are always available; if the user didn't set it, will link to a
     # placeholder image
+    account = core.load_account(status_file)
     for picture in ["avatar", "header"]:
-        urls[(data["account"][picture], None)] = 1
+        urls[(account[picture], None)] = 1
 
     urls = list(urls.keys())
 
@@ -161,13 +163,14 @@ def media(args):
                     break
                 
             now = time.time()
-            next_time = min((hosts_raced.get(h, now)
-                             for h in rate_limit_exceptions))
+            next_host = min(rate_limit_exceptions,
+                            key=lambda h: hosts_raced.get(h, now))
+            next_time = hosts_raced.get(next_host, now)
             if next_time > now:
                 wait_time = next_time - now
                 if not args.suppress_errors:
                     print(f'\nWaiting {wait_time:.0f} seconds for rate limits to expire')
-                time.sleep(wait_time)
+                metrics.sleep(next_host, wait_time)
         else:
             if not args.quiet:
                 bar.finish()
@@ -178,27 +181,30 @@ def media(args):
 
 
 def download(url, remoteurl, file_name, args, from404=True):
-    req = urllib.request.Request(
-        url, data=None,
-        headers={'User-Agent': 'Mastodon-Archive/1.3 '
-                    '(+https://github.com/kensanata/mastodon-archive#mastodon-archive)'})
-    
-    if req.host in hosts_raced:
-        if time.time() < hosts_raced[req.host]:
-            raise RateLimitException(req.host)
-        hosts_raced.pop(req.host)
+    host = urlparse(url).netloc
+    headers = {'User-Agent': 'Mastodon-Archive/1.3 '
+               '(+https://github.com/kensanata/mastodon-archive#mastodon-archive)'}
+
+    if host in hosts_raced:
+        if time.time() < hosts_raced[host]:
+            raise RateLimitException(host)
+        hosts_raced.pop(host)
 
     if args.pace:
-        if req.host not in hosts_paces:
-            hosts_paces[req.host] = DEFAULT_PACE
-        elif req.host in hosts_paced:
-            time.sleep(max(0, hosts_paced[req.host] - time.time()))
-        hosts_paced[req.host] = time.time() + hosts_paces[req.host]
+        if host not in hosts_paces:
+            hosts_paces[host] = DEFAULT_PACE
+        elif host in hosts_paced:
+            metrics.sleep(host, hosts_paced[host] - time.time())
+        hosts_paced[host] = time.time() + hosts_paces[host]
 
     try:
-        with urllib.request.urlopen(req) as response, open(file_name, 'wb') as fp:
-            data = response.read()
-            fp.write(data)
+        # the connection is kept open for the next file from the same host
+        with connection.session().get(url, headers=headers, stream=True,
+                                      timeout=300) as response:
+            response.raise_for_status()
+            with open(file_name, 'wb') as fp:
+                for chunk in response.iter_content(chunk_size=65536):
+                    fp.write(chunk)
         # On success, clear any history maintained by `check_if_permanent_error`
         try:
             os.remove(f"{file_name}.errors")
@@ -209,31 +215,32 @@ def download(url, remoteurl, file_name, args, from404=True):
         if not args.suppress_errors:
             print("\nFailed to open " + url + " during a media request.")
 
-        if he.status == 429:
+        status = he.response.status_code
+        if status == 429:
             if not args.suppress_errors:
-                print(f'\nDelaying next request to {req.host}')
+                print(f'\nDelaying next request to {host}')
             if args.pace:
                 # Slow down the pace for this host because we're apparently not
                 # waiting long enough to avoid its rate-limiting
-                hosts_paces[req.host] *= 1.1
-                if req.host not in hosts_paces_first:
-                    hosts_paces_first[req.host] = hosts_paces[req.host]
+                hosts_paces[host] *= 1.1
+                if host not in hosts_paces_first:
+                    hosts_paces_first[host] = hosts_paces[host]
                     write_paces_file()
-            if reset := he.headers['x-ratelimit-reset']:
-                hosts_raced[req.host] = \
+            if reset := he.response.headers.get('x-ratelimit-reset'):
+                hosts_raced[host] = \
                     datetime.datetime.fromisoformat(reset).timestamp()
             else:
-                hosts_raced[req.host] = time.time() + 3*60
-            raise RateLimitException(req.host)
+                hosts_raced[host] = time.time() + 3*60
+            raise RateLimitException(host)
 
         # We stop trying to download 401, 403, and 404 because 401 and 403
         # almost always means the server has authorized fetch enabled
         # and we're never going to be able to download.
         if remoteurl:
             return download(remoteurl, None, file_name, args,
-                            from404=he.status in (401, 403, 404))
+                            from404=status in (401, 403, 404))
 
-        if from404 and he.status in (401, 403, 404):
+        if from404 and status in (401, 403, 404):
             flag = f"{file_name}.missing"
             if not args.suppress_errors:
                 print(f"\nSuppressing future downloads with {flag}.")
@@ -242,7 +249,7 @@ def download(url, remoteurl, file_name, args, from404=True):
 
         check_if_permanent_error(url, file_name, he, args)
         return False
-    except URLError as ue:
+    except RequestException as ue:
         if not args.suppress_errors:
             print("\nFailed to open " + url + " during a media request.")
         if remoteurl:
@@ -251,6 +258,18 @@ def download(url, remoteurl, file_name, args, from404=True):
         return False
 
 
+def describe(error):
+    """
+    Return a description of a download error that's the same every
+    time the error happens. HTTP errors are described like urllib did.
+    """
+    if isinstance(error, HTTPError):
+        return "<HTTPError %d: %r>" % (error.response.status_code,
+                                       error.response.reason)
+    # the message usually mentions objects and their addresses
+    return type(error).__name__
+
+
 def check_if_permanent_error(url, file_name, error, args):
     """
     Record a download error for this media and possibly suppress further attempts.
@@ -258,7 +277,7 @@ def check_if_permanent_error(url, file_name, error, args):
     Suppression occurs if the same error has been observed on all attempts for
     at least two weeks.
     """
-    error_string = repr(error)
+    error_string = describe(error)
     errors_path = f"{file_name}.errors"
 
     add_entry = {'timestamp': time.time(), 'url': url, 'error': error_string}
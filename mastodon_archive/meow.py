@@ -111,7 +111,7 @@ def serve(port, origin, data, media_dir, media_files, file_cb):
                 self.send_header("Content-type", "application/json")
                 self.end_headers()
 
-                self.wfile.write(bytes(json.dumps(data), "utf-8"))
+                self.wfile.write(bytes(json.dumps(dict(data)), "utf-8"))
 
                 file_cb()
             elif "file" in query and query["file"][0] in media_files:
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026  Alex Schroeder <alex@gnu.org>
+
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+# When a command is slow, it's hard to tell whether it's waiting for the
+# rate limit, waiting for slow responses, or busy with the archive. For
+# every host and every endpoint, we count the requests, the errors (no
+# response or "5xx"), the responses saying "429 Too Many Requests", the
+# requests that were retries of a request that failed, and the bytes
+# received, and we keep a histogram of how long the requests took. For
+# every host, we add up the seconds spent waiting for the rate limit.
+#
+# Endpoints are the method and the path of API requests with the ids
+# replaced, e.g. "GET /api/v1/accounts/:id/statuses". Requests for
+# anything else are media downloads. The bytes of media downloads are
+# what the Content-Length header says.
+#
+# With --metrics FILE, a JSON summary is written when the command is
+# done. With --metrics-textfile FILE, the same is written in the text
+# format of Prometheus, for the textfile collector of the node exporter.
+# With --parallel, the other processes send us what they counted.
+
+import atexit
+import json
+import os
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+from requests.adapters import BaseAdapter
+
+# the upper bounds of the latency histogram, in seconds
+BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+# the files set by the --metrics and --metrics-textfile options
+json_file = None
+textfile = None
+
+_lock = threading.Lock()
+_hosts = {}
+# the requests that failed and will probably be tried again
+_failed = set()
+
+def endpoint(method, path):
+    if path.startswith("/api/"):
+        return method + " " + re.sub(r"/\d+(?=/|$)", "/:id", path)
+    return method + " media"
+
+def _host(host):
+    if host not in _hosts:
+        _hosts[host] = {"waited": 0.0, "endpoints": {}}
+    return _hosts[host]
+
+def _endpoint(host, name):
+    endpoints = _host(host)["endpoints"]
+    if name not in endpoints:
+        endpoints[name] = {"requests": 0, "errors": 0, "throttled": 0,
+                           "retries": 0, "bytes": 0, "seconds": 0.0,
+                           "latency": [0] * (len(BUCKETS) + 1)}
+    return endpoints[name]
+
+def request(method, url, seconds, status=None, size=0):
+    """
+    Count a request. The status is None if there was no response.
+    """
+    parts = urlsplit(url)
+    key = (method, url)
+    failed = status is None or status == 429 or status >= 500
+    with _lock:
+        data = _endpoint(parts.netloc, endpoint(method, parts.path))
+        data["requests"] += 1
+        data["bytes"] += size
+        data["seconds"] += seconds
+        data["latency"][next((i for i, bound in enumerate(BUCKETS)
+                              if seconds <= bound), len(BUCKETS))] += 1
+        if status is None or status >= 500:
+            data["errors"] += 1
+        elif status == 429:
+            data["throttled"] += 1
+        if key in _failed:
+            data["retries"] += 1
+        if failed:
+            _failed.add(key)
+        else:
+            _failed.discard(key)
+
+def waited(host, seconds):
+    """
+    Count the seconds spent waiting for the rate limit of a host.
+    """
+    if seconds <= 0:
+        return
+    with _lock:
+        _host(host)["waited"] += seconds
+
+def sleep(host, seconds):
+    """
+    Wait for the rate limit of a host.
+    """
+    if seconds > 0:
+        time.sleep(seconds)
+        waited(host, seconds)
+
+def take():
+    """
+    Return what was counted and start from zero.
+    """
+    global _hosts
+    with _lock:
+        hosts = _hosts
+        _hosts = {}
+        _failed.clear()
+    return hosts
+
+def merge(hosts):
+    """
+    Add what another process counted.
+    """
+    with _lock:
+        for host, other in hosts.items():
+            _host(host)["waited"] += other["waited"]
+            for name, values in other["endpoints"].items():
+                data = _endpoint(host, name)
+                for key in ("requests", "errors", "throttled", "retries",
+                            "bytes", "seconds"):
+                    data[key] += values[key]
+                data["latency"] = [a + b for a, b in
+                                   zip(data["latency"], values["latency"])]
+
+def summary():
+    """
+    Return the summary written by --metrics. The latency histogram is
+    cumulative, as in Prometheus: for every upper bound, the number of
+    requests that took at most that long.
+    """
+    with _lock:
+        hosts = {}
+        for host, data in sorted(_hosts.items()):
+            endpoints = {}
+            for name, values in sorted(data["endpoints"].items()):
+                endpoints[name] = dict(values, seconds=round(values["seconds"], 3),
+                                       latency=cumulative(values["latency"]))
+            hosts[host] = {"waited": round(data["waited"], 3),
+                           "endpoints": endpoints}
+    return {"requests": sum(e["requests"] for h in hosts.values()
+                            for e in h["endpoints"].values()),
+            "bytes": sum(e["bytes"] for h in hosts.values()
+                         for e in h["endpoints"].values()),
+            "waited": round(sum(h["waited"] for h in hosts.values()), 3),
+            "hosts": hosts}
+
+def cumulative(counts):
+    result = {}
+    total = 0
+    for bound, count in zip([str(b) for b in BUCKETS] + ["+Inf"], counts):
+        total += count
+        result[bound] = total
+    return result
+
+def label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def prometheus(data):
+    """
+    Return the summary in the text format of Prometheus.
+    """
+    lines = []
+    def metric(name, kind, help, samples):
+        lines.append("# HELP mastodon_archive_%s %s" % (name, help))
+        lines.append("# TYPE mastodon_archive_%s %s" % (name, kind))
+        for suffix, labels, value in samples:
+            lines.append("mastodon_archive_%s%s{%s} %s" % (
+                name, suffix, ",".join('%s="%s"' % (k, label(v)) for k, v in labels),
+                value))
+    def counter(name, key, help):
+        metric(name, "counter", help,
+               [("", [("host", host), ("endpoint", endpoint)], values[key])
+                for host, hostdata in data["hosts"].items()
+                for endpoint, values in hostdata["endpoints"].items()])
+    counter("requests_total", "requests", "Requests made.")
+    counter("request_errors_total", "errors",
+            "Requests without a response or with a server error.")
+    counter("rate_limited_total", "throttled",
+            "Responses saying 429 Too Many Requests.")
+    counter("retries_total", "retries", "Requests repeating a failed request.")
+    counter("response_bytes_total", "bytes", "Bytes received.")
+    samples = []
+    for host, hostdata in data["hosts"].items():
+        for endpoint, values in hostdata["endpoints"].items():
+            labels = [("host", host), ("endpoint", endpoint)]
+            for bound, count in values["latency"].items():
+                samples.append(("_bucket", labels + [("le", bound)], count))
+            samples.append(("_sum", labels, values["seconds"]))
+            samples.append(("_count", labels, values["requests"]))
+    metric("request_duration_seconds", "histogram",
+           "How long requests took.", samples)
+    metric("rate_limit_wait_seconds_total", "counter",
+           "Seconds spent waiting for the rate limit.",
+           [("", [("host", host)], hostdata["waited"])
+            for host, hostdata in data["hosts"].items()])
+    metric("last_run_timestamp_seconds", "gauge",
+           "When the command was done.", [("", [], round(time.time(), 3))])
+    return "\n".join(lines) + "\n"
+
+def write(file_name, text):
+    # the textfile collector must never see half a file
+    new_file = f'{file_name}.{os.getpid()}.new'
+    with open(new_file, mode='w', encoding='utf-8') as fp:
+        fp.write(text)
+    os.replace(new_file, file_name)
+
+def store():
+    """
+    Write the files asked for by --metrics and --metrics-textfile.
+    """
+    if not json_file and not textfile:
+        return
+    data = summary()
+    if json_file:
+        write(json_file, json.dumps(data, indent=2) + "\n")
+    if textfile:
+        write(textfile, prometheus(data))
+
+atexit.register(store)
+
+class Meter(BaseAdapter):
+    """
+    A transport adapter that counts the requests sent by another one.
+    """
+
+    def __init__(self, adapter):
+        super().__init__()
+        self.adapter = adapter
+
+    def send(self, prepared, **kwargs):
+        start = time.monotonic()
+        try:
+            response = self.adapter.send(prepared, **kwargs)
+        except Exception:
+            request(prepared.method, prepared.url, time.monotonic() - start)
+            raise
+        if kwargs.get("stream"):
+            size = int(response.headers.get("Content-Length") or 0)
+        else:
+            size = len(response.content)
+        request(prepared.method, prepared.url, time.monotonic() - start,
+                response.status_code, size)
+        return response
+
+    def close(self):
+        self.adapter.close()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026  Alex Schroeder <alex@gnu.org>
+
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+# Every status comes with the full account of its author, and most of
+# them are yours. The same status may also appear in several
+# collections: your boosts, favourites, bookmarks, mentions and
+# replies. A normalized archive in the json layout stores every account
+# and every status once, in tables at the beginning of the file, and
+# the rest of the archive only refers to them:
+#
+# {
+#   "normalized": ["accounts", "statuses"],
+#   "accounts": {
+#     "123": [{"id": "123", "username": "alex", ...}, ...]
+#   },
+#   "status_table": {
+#     "456": [{"id": "456", "account": {"id": "123"}, ...}, ...]
+#   },
+#   "statuses": [{"id": "456"}, ...],
+#   ...
+# }
+#
+# Boosts refer to the boosted status in the same way. When something
+# changed over time, all its versions are kept, the first one being the
+# one seen first (usually the latest), and older versions are referred
+# to as {"id": "123", "version": 1}. When the archive is loaded, the
+# references are replaced again. Statuses by the same version of an
+# account share the same object. Every status in a collection is a
+# separate dict since commands like expire mark them as deleted, but
+# what's inside is shared.
+
+import json
+import re
+from . import core
+
+# how a normalized archive starts
+header = re.compile(r'\s*\{\s*"normalized"')
+
+# the collections with statuses
+COLLECTIONS = ["statuses", "favourites", "bookmarks", "mentions", "replies"]
+
+def modes(data):
+    """
+    Return how an archive is normalized.
+    """
+    return data.get("normalized", [])
+
+class Table:
+    """
+    The distinct versions of things with an id, such as accounts.
+    """
+
+    def __init__(self):
+        self.versions = {}
+        # for every id, map the JSON of every version to its number
+        self.texts = {}
+        # map the things seen to their references
+        self.refs = {}
+
+    def ref(self, item, encode=None):
+        """
+        Add an item and return its reference. If given, encode returns
+        what to store.
+        """
+        if not isinstance(item, dict) or "id" not in item:
+            return item
+        # things loaded from a normalized archive are shared
+        if id(item) in self.refs:
+            return self.refs[id(item)]
+        key = str(item["id"])
+        stored = encode(item) if encode else item
+        text = json.dumps(stored, sort_keys=True, default=core.date_handler)
+        seen = self.texts.setdefault(key, {})
+        if text not in seen:
+            seen[text] = len(seen)
+            self.versions.setdefault(key, []).append(stored)
+        result = {"id": key}
+        if seen[text]:
+            result["version"] = seen[text]
+        self.refs[id(item)] = result
+        return result
+
+def lookup(table, ref):
+    """
+    Return what a reference refers to.
+    """
+    if isinstance(ref, dict) and "id" in ref:
+        versions = table.get(str(ref["id"]))
+        if versions:
+            return versions[ref.get("version", 0)]
+    return ref
+
+def compact(data):
+    """
+    Return the data to write for a normalized archive. The data itself
+    is not changed.
+    """
+    if not modes(data):
+        return data
+
+    accounts = Table()
+    statuses = Table()
+
+    def encode(status):
+        if not isinstance(status, dict):
+            return status
+        status = dict(status)
+        if "accounts" in modes(data) and "account" in status:
+            status["account"] = accounts.ref(status["account"])
+        if isinstance(status.get("reblog"), dict):
+            if "statuses" in modes(data):
+                status["reblog"] = statuses.ref(status["reblog"], encode)
+            else:
+                status["reblog"] = encode(status["reblog"])
+        return status
+
+    result = {"normalized": modes(data)}
+    collections = {}
+    for name, value in data.items():
+        if name in result:
+            continue
+        if name in COLLECTIONS and isinstance(value, list):
+            if "statuses" in modes(data):
+                value = [statuses.ref(status, encode) for status in value]
+            else:
+                value = [encode(status) for status in value]
+        collections[name] = value
+    if "accounts" in modes(data):
+        result["accounts"] = accounts.versions
+    if "statuses" in modes(data):
+        result["status_table"] = statuses.versions
+    result.update(collections)
+    return result
+
+def expand(data):
+    """
+    Replace the references in a normalized archive.
+    """
+    if not modes(data):
+        return data
+
+    accounts = data.pop("accounts", {})
+    statuses = data.pop("status_table", {})
+
+    def restore(status):
+        if isinstance(status, dict):
+            if "accounts" in modes(data) and "account" in status:
+                status["account"] = lookup(accounts, status["account"])
+            if "statuses" in modes(data):
+                if status.get("reblog") is not None:
+                    status["reblog"] = lookup(statuses, status["reblog"])
+            elif isinstance(status.get("reblog"), dict):
+                restore(status["reblog"])
+
+    for versions in statuses.values():
+        for status in versions:
+            restore(status)
+
+    for name in COLLECTIONS:
+        if isinstance(data.get(name), list):
+            if "statuses" in modes(data):
+                data[name] = [dict(lookup(statuses, ref))
+                              if isinstance(ref, dict) and "id" in ref else ref
+                              for ref in data[name]]
+            else:
+                for status in data[name]:
+                    restore(status)
+    return data
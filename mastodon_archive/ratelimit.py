@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026  Alex Schroeder <alex@gnu.org>
+
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+# Every command talking to your instance uses the same Mastodon object,
+# wrapped in a Budget. Mastodon.py reads the X-RateLimit-Limit,
+# X-RateLimit-Remaining and X-RateLimit-Reset headers of every response
+# and waits when no requests are left. The Budget spreads the requests
+# left evenly over the time until the reset instead, so that a long
+# archive run doesn't use up all the requests in the first minute and
+# then waits for the rest of the five minutes.
+#
+# The archive command fetches collections in several threads. They all
+# share the Budget: there are never more requests on their way than
+# there are requests left.
+#
+# What we learned about the rate limit of an instance is kept in a file
+# so that the next command doesn't start with a burst of requests when
+# the last one used most of them:
+#
+# example.org:300:12:1767225600.0
+#
+# That's the instance, the limit, the requests left and when they reset.
+
+import atexit
+import contextlib
+import os
+import threading
+import time
+from . import metrics
+
+try:
+    import fcntl
+except ImportError:
+    # on Windows, --parallel processes may overwrite each other's limits
+    fcntl = None
+
+limits_file = 'rate_limits.txt'
+lock_file = 'rate_limits.txt.lock'
+
+# the budgets to store when we're done
+budgets = []
+
+def read_limits_file():
+    """
+    Return the rate limits for every instance we know.
+    """
+    limits = {}
+    if not os.path.exists(limits_file):
+        return limits
+    with open(limits_file) as f:
+        for line in f:
+            try:
+                (host, limit, remaining, reset) = line.strip().split(':')
+                limits[host] = (int(limit), int(remaining), float(reset))
+            except ValueError:
+                continue
+    return limits
+
+@contextlib.contextmanager
+def locked():
+    """
+    Keep other processes from changing the rate limits file meanwhile.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(lock_file, 'a') as fp:
+        fcntl.flock(fp, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fp, fcntl.LOCK_UN)
+
+def write_limits_file(limits):
+    new_file = f'{limits_file}.{os.getpid()}.new'
+    with open(new_file, 'w') as f:
+        for host, (limit, remaining, reset) in limits.items():
+            print(f'{host}:{limit}:{remaining}:{reset}', file=f)
+    os.replace(new_file, limits_file)
+
+class Budget:
+    """
+    A Mastodon object whose requests are spread over the rate limit
+    window, shared between threads.
+    """
+
+    def __init__(self, mastodon, host=None, pace=True):
+        self.mastodon = mastodon
+        self.host = host
+        # the async engine paces its requests itself
+        self.pace = pace
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        # when the next request may start
+        self.next_call = 0
+        if host:
+            self.restore()
+            budgets.append(self)
+
+    def __getattr__(self, name):
+        value = getattr(self.mastodon, name)
+        if not callable(value) or not self.pace:
+            return value
+        def call(*args, **kwargs):
+            self.acquire()
+            try:
+                return value(*args, **kwargs)
+            finally:
+                self.release()
+        return call
+
+    def fetch_remaining(self, first_page):
+        """
+        Like Mastodon.fetch_remaining(first_page) but every page counts
+        against the budget.
+        """
+        result = list(first_page)
+        page = first_page
+        while page:
+            page = self.fetch_next(page)
+            if page:
+                result.extend(page)
+        return result
+
+    def remaining(self):
+        """
+        Return the number of requests left, or None if nobody knows.
+        """
+        remaining = getattr(self.mastodon, "ratelimit_remaining", None)
+        reset = getattr(self.mastodon, "ratelimit_reset", None)
+        if remaining is None or reset is None or time.time() >= reset:
+            return None
+        return remaining - self.in_flight
+
+    def interval(self):
+        """
+        Return the seconds until the next request may start so that the
+        requests left last until the reset.
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return 0
+        wait = self.mastodon.ratelimit_reset - time.time()
+        if remaining <= 0:
+            return wait
+        return wait / remaining
+
+    def acquire(self):
+        # other threads wait while we sleep, which is what we want
+        with self.lock:
+            metrics.sleep(self.host, self.next_call - time.time())
+            if self.remaining() is not None and self.remaining() <= 0:
+                metrics.sleep(self.host, self.mastodon.ratelimit_reset - time.time())
+            self.in_flight += 1
+            self.next_call = time.time() + self.interval()
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def restore(self):
+        """
+        Continue with the rate limit the last command left us with.
+        """
+        limits = read_limits_file()
+        if self.host not in limits:
+            return
+        (limit, remaining, reset) = limits[self.host]
+        if reset > time.time():
+            self.mastodon.ratelimit_limit = limit
+            self.mastodon.ratelimit_remaining = remaining
+            self.mastodon.ratelimit_reset = reset
+
+    def limits(self):
+        """
+        Return the limit, the requests left and when they reset, or
+        None if we don't know.
+        """
+        limit = getattr(self.mastodon, "ratelimit_limit", None)
+        remaining = getattr(self.mastodon, "ratelimit_remaining", None)
+        reset = getattr(self.mastodon, "ratelimit_reset", None)
+        if limit is None or remaining is None or reset is None:
+            return None
+        return (int(limit), int(remaining), float(reset))
+
+    def store(self):
+        """
+        Remember the rate limit for the next command.
+        """
+        store([self])
+
+def store(stored=None):
+    """
+    Remember the rate limits of the budgets for the next command, all
+    of them unless given.
+    """
+    if stored is None:
+        stored = list(budgets)
+        budgets.clear()
+    known = [(budget.host, budget.limits()) for budget in stored]
+    known = [(host, limits) for host, limits in known if limits]
+    if not known:
+        return
+    # accounts on other instances may be archived at the same time
+    # (--parallel), so read, change and write while nobody else does
+    with locked():
+        limits = read_limits_file()
+        limits.update(known)
+        write_limits_file(limits)
+
+atexit.register(store)
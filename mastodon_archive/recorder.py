@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026  Alex Schroeder <alex@gnu.org>
+
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+# With --record DIR, every request made through the shared session (see
+# connection.py) and its response are written to DIR. With --replay
+# DIR, the responses are read from DIR instead of asking the instance,
+# so a slow run can be repeated without network access, as often as you
+# like, e.g. to profile it or to find the commit that made it slow.
+#
+# Every process appends to a file of its own, one JSON object per line
+# with the method, the URL, a hash of the request body, the status, the
+# headers of the response, when the request was made and how long it
+# took. The bodies of the responses are kept in files named after their
+# hash so that every media file is stored once:
+#
+# DIR/exchanges.4711.jsonl
+# DIR/bodies/3b5d5c3712955042212316173ccf37be800c2a1b6fd3a8d5b2a6c6a4f9e4b7a1
+#
+# The request headers are not recorded: they have your access token.
+# The responses have whatever your instance sent, so keep the recording
+# to yourself.
+#
+# A request is answered with the next response recorded for the same
+# method, URL and body, in the order they were recorded. Once they are
+# used up, the last one is used again. A request that was never recorded
+# fails like a request to an instance that is offline. Replaying waits
+# as long as the request took when recording it; use --replay-speed to
+# change that.
+
+import collections
+import datetime
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+# the body is stored decoded
+DROPPED_HEADERS = ["Content-Encoding", "Transfer-Encoding", "Content-Length"]
+
+RATE_LIMIT_HEADERS = ["X-RateLimit-Limit", "X-RateLimit-Remaining",
+                      "X-RateLimit-Reset"]
+
+def digest(body):
+    """
+    Return the hash of a request or response body, or None if there
+    is no body.
+    """
+    if body is None:
+        return None
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    return hashlib.sha256(body).hexdigest()
+
+def body_file(directory, name):
+    return os.path.join(directory, "bodies", name)
+
+class Recorder(HTTPAdapter):
+    """
+    A transport adapter that writes every request and its response to
+    a directory.
+    """
+
+    def __init__(self, directory, **kwargs):
+        super().__init__(**kwargs)
+        self.directory = directory
+        self.lock = threading.Lock()
+        os.makedirs(os.path.join(directory, "bodies"), exist_ok=True)
+
+    def send(self, request, **kwargs):
+        started = time.time()
+        response = super().send(request, **kwargs)
+        # media downloads are streamed but we need all of it
+        content = response.content
+        elapsed = time.time() - started
+        self.write(request, response, content, started, elapsed)
+        return response
+
+    def write(self, request, response, content, started, elapsed):
+        name = digest(content)
+        path = body_file(self.directory, name)
+        if not os.path.exists(path):
+            new_path = f'{path}.{os.getpid()}.{threading.get_ident()}.new'
+            with open(new_path, mode='wb') as fp:
+                fp.write(content)
+            os.replace(new_path, path)
+        headers = {key: value for key, value in response.headers.items()
+                   if key not in DROPPED_HEADERS}
+        exchange = {"method": request.method, "url": request.url,
+                    "body": digest(request.body), "status": response.status_code,
+                    "reason": response.reason, "headers": headers,
+                    "content": name, "time": started, "elapsed": elapsed}
+        file_name = os.path.join(self.directory,
+                                 f'exchanges.{os.getpid()}.jsonl')
+        with self.lock:
+            with open(file_name, mode='a', encoding='utf-8') as fp:
+                fp.write(json.dumps(exchange) + "\n")
+
+def read(directory):
+    """
+    Return the recorded exchanges for every method, URL and body, in
+    the order they were recorded.
+    """
+    exchanges = []
+    for file_name in glob.glob(os.path.join(glob.escape(directory),
+                                            "exchanges.*.jsonl")):
+        with open(file_name, encoding='utf-8') as fp:
+            for line in fp:
+                try:
+                    exchanges.append(json.loads(line))
+                except ValueError:
+                    # the last line is incomplete if we were interrupted
+                    continue
+    exchanges.sort(key=lambda exchange: exchange["time"])
+    result = collections.defaultdict(collections.deque)
+    for exchange in exchanges:
+        key = (exchange["method"], exchange["url"], exchange["body"])
+        result[key].append(exchange)
+    return result
+
+class Player(BaseAdapter):
+    """
+    A transport adapter that answers requests with the responses
+    recorded in a directory.
+    """
+
+    def __init__(self, directory, speed=1):
+        super().__init__()
+        self.directory = directory
+        self.speed = speed
+        self.lock = threading.Lock()
+        self.exchanges = read(directory)
+
+    def next(self, request):
+        key = (request.method, request.url, digest(request.body))
+        with self.lock:
+            exchanges = self.exchanges.get(key)
+            if not exchanges:
+                return None
+            if len(exchanges) > 1:
+                return exchanges.popleft()
+            return exchanges[0]
+
+    def send(self, request, **kwargs):
+        exchange = self.next(request)
+        if exchange is None:
+            raise requests.exceptions.ConnectionError(
+                "%s %s was not recorded" % (request.method, request.url),
+                request=request)
+        if self.speed:
+            time.sleep(exchange["elapsed"] * self.speed)
+        with open(body_file(self.directory, exchange["content"]), mode='rb') as fp:
+            content = fp.read()
+        headers = CaseInsensitiveDict(exchange["headers"])
+        if not self.speed:
+            # don't wait for the rate limit either
+            for key in RATE_LIMIT_HEADERS:
+                headers.pop(key, None)
+        response = requests.Response()
+        response.status_code = exchange["status"]
+        response.reason = exchange["reason"]
+        response.headers = headers
+        response.encoding = get_encoding_from_headers(headers)
+        response.url = request.url
+        response.request = request
+        response.elapsed = datetime.timedelta(seconds=exchange["elapsed"])
+        response._content = content
+        response._content_consumed = True
+        return response
+
+    def close(self):
+        pass
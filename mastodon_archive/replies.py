@@ -17,38 +17,14 @@ import sys
 import os.path
 from progress.bar import Bar
 from . import core
+from . import database
+from . import journal
 
-def replies(args):
+def find_missing(data, args):
     """
-    Archive the statuses you replied to
+    Return the ids of the statuses you replied to which are not in the
+    archive.
     """
-
-    (username, domain) = core.parse(args.user)
-
-    status_file = domain + '.user.' + username + '.json'
-    data = core.load(status_file, required = True, quiet = args.quiet)
-
-    mastodon = core.login(args)
-
-    if not args.quiet:
-        print("Get user info")
-
-    try:
-        user = mastodon.account_verify_credentials()
-    except Exception as e:
-        if "access token was revoked" in str(e):
-            core.deauthorize(args)
-             # retry and exit without an error
-            archive(args)
-            sys.exit(0)
-        elif "Name or service not known" in str(e):
-            print("Error: the instance name is either misspelled or offline",
-              file=sys.stderr)
-        else:
-            print(e, file=sys.stderr)
-        # exit in either case
-        sys.exit(1)
-
     index = {} # mapping ids to statuses
     missing = [] # ids we need to fetch
 
@@ -86,6 +62,48 @@ def replies(args):
                 missing.append(status["in_reply_to_id"])
     if not args.quiet:
         print("Missing %d originals..." % (len(missing)))
+    return missing
+
+def replies(args):
+    """
+    Archive the statuses you replied to
+    """
+
+    (username, domain) = core.parse(args.user)
+
+    status_file = domain + '.user.' + username + '.json'
+    data = core.load(status_file, required = True, quiet = args.quiet)
+
+    mastodon = core.login(args)
+
+    if not args.quiet:
+        print("Get user info")
+
+    try:
+        user = mastodon.account_verify_credentials()
+    except Exception as e:
+        if "access token was revoked" in str(e):
+            core.deauthorize(args)
+             # retry and exit without an error
+            archive(args)
+            sys.exit(0)
+        elif "Name or service not known" in str(e):
+            print("Error: the instance name is either misspelled or offline",
+              file=sys.stderr)
+        else:
+            print(e, file=sys.stderr)
+        # exit in either case
+        sys.exit(1)
+
+    if core.archive_layout(status_file) == "sqlite":
+        # the database has indexes for this
+        if not args.quiet:
+            print("Counting missing replies...")
+        missing = database.missing_replies(status_file)
+        if not args.quiet:
+            print("Missing %d originals..." % (len(missing)))
+    else:
+        missing = find_missing(data, args)
 
     if len(missing) > 300:
         if not args.quiet:
@@ -93,29 +111,45 @@ def replies(args):
                   "this will take about %d minutes" % (len(missing) // 300 * 5))
 
     if len(missing) > 0:
+        changes = journal.Changes()
         if not "replies" in data:
             replies = []
+            changes.replaced("replies")
         else:
             replies = data["replies"]
 
         if not args.quiet:
             bar = Bar('Fetching', max = len(missing))
 
-        for id in missing:
-            try:
-                status = mastodon.status(id)
-                replies.append(status)
-            except Exception as e:
-                if  "not found" in str(e) or "Not Found" in str(e):
-                    pass
-                else:
-                    print(e, file=sys.stderr)
-
-            if not args.quiet:
-                bar.next()
+        if args.use_async:
+            # the engine fetches a batch at the same time
+            for i in range(0, len(missing), 100):
+                batch = missing[i:i + 100]
+                for status in mastodon.fetch_statuses(batch):
+                    if isinstance(status, Exception):
+                        print(status, file=sys.stderr)
+                    elif status is not None:
+                        replies.append(status)
+                        changes.added("replies", status)
+                if not args.quiet:
+                    bar.next(len(batch))
+        else:
+            for id in missing:
+                try:
+                    status = mastodon.status(id)
+                    replies.append(status)
+                    changes.added("replies", status)
+                except Exception as e:
+                    if  "not found" in str(e) or "Not Found" in str(e):
+                        pass
+                    else:
+                        print(e, file=sys.stderr)
+
+                if not args.quiet:
+                    bar.next()
 
         if not args.quiet:
             bar.finish()
 
         data["replies"] = replies
-        core.save(status_file, data, quiet=args.quiet)
+        core.save(status_file, data, quiet=args.quiet, changes=changes)
@@ -99,57 +99,50 @@ def report(args):
     (username, domain) = args.user.split('@')
 
     status_file = domain + '.user.' + username + '.json'
-    data = core.load(status_file, required=True, quiet=True, combine=args.combine)
+
+    # Stream the collections so that only the statuses we're going to
+    # report on are kept in memory.
+    def collection(name):
+        return core.iter_collection(status_file, name, combine=args.combine)
 
     if args.all:
         print("Considering the entire archive")
-        if "statuses" in data:
-            statuses = data["statuses"]
-        if "favourites" in data:
-            favourites = data["favourites"]
-        if "bookmarks" in data:
-            bookmarks = data["bookmarks"]
+        statuses = list(collection("statuses"))
+        favourites = list(collection("favourites"))
+        bookmarks = list(collection("bookmarks"))
     else:
         print("Considering the last "
               + str(args.weeks)
               + " weeks")
-        if "statuses" in data:
-            statuses = core.keep(data["statuses"], args.weeks)
-        if "favourites" in data:
-            favourites = core.keep(data["favourites"], args.weeks)
-        if "bookmarks" in data:
-            bookmarks = core.keep(data["bookmarks"], args.weeks)
-
-    if "statuses" in data:
-        print("Statuses:".ljust(20), str(len(statuses)).rjust(6))
-        print("Boosts:".ljust(20), str(boosts(statuses)).rjust(6))
-        print("Media:".ljust(20), str(media(statuses)).rjust(6))
+        statuses = core.keep(collection("statuses"), args.weeks)
+        favourites = core.keep(collection("favourites"), args.weeks)
+        bookmarks = core.keep(collection("bookmarks"), args.weeks)
 
-        print()
-        print_tags(statuses, args.top, args.include_boosts)
+    print("Statuses:".ljust(20), str(len(statuses)).rjust(6))
+    print("Boosts:".ljust(20), str(boosts(statuses)).rjust(6))
+    print("Media:".ljust(20), str(media(statuses)).rjust(6))
 
-        if args.with_emoji:
-            print()
-            print_emoji(statuses)
+    print()
+    print_tags(statuses, args.top, args.include_boosts)
 
-    if "statuses" in data and "favourites" in data:
+    if args.with_emoji:
         print()
+        print_emoji(statuses)
 
-    if "favourites" in data:
-        print("Favourites:".ljust(20), str(len(favourites)).rjust(6))
-        print("Boosts:".ljust(20), str(boosts(favourites)).rjust(6))
-        print("Media:".ljust(20), str(media(favourites)).rjust(6))
+    print()
 
-        print()
-        print_tags(favourites, args.top, args.include_boosts)
+    print("Favourites:".ljust(20), str(len(favourites)).rjust(6))
+    print("Boosts:".ljust(20), str(boosts(favourites)).rjust(6))
+    print("Media:".ljust(20), str(media(favourites)).rjust(6))
 
-    if "favourites" in data and "bookmarks" in data:
-        print()
+    print()
+    print_tags(favourites, args.top, args.include_boosts)
 
-    if "bookmarks" in data:
-        print("Bookmarks:".ljust(20), str(len(bookmarks)).rjust(6))
-        print("Boosts:".ljust(20), str(boosts(bookmarks)).rjust(6))
-        print("Media:".ljust(20), str(media(bookmarks)).rjust(6))
+    print()
 
-        print()
-        print_tags(bookmarks, args.top, args.include_boosts)
+    print("Bookmarks:".ljust(20), str(len(bookmarks)).rjust(6))
+    print("Boosts:".ljust(20), str(boosts(bookmarks)).rjust(6))
+    print("Media:".ljust(20), str(media(bookmarks)).rjust(6))
+
+    print()
+    print_tags(bookmarks, args.top, args.include_boosts)
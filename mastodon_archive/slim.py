@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026  Alex Schroeder <alex@gnu.org>
+
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+import json
+from . import core
+
+# Fields that are always dropped: Mastodon.py adds the pagination
+# information to the first and last item of every page and it's
+# useless once the page has been fetched. The filters of yours that
+# matched a status when it was fetched are of no use later, either.
+# The text_url of media attachments is an old name for their url, and
+# their blurhash is what your browser shows until it has the image.
+# Anything else is kept unless you use --drop since we can't tell
+# whether you'll need it.
+FIELDS = ["_pagination_prev", "_pagination_next",
+          "filtered", "reblog.filtered",
+          "media_attachments.text_url", "media_attachments.blurhash",
+          "reblog.media_attachments.text_url",
+          "reblog.media_attachments.blurhash"]
+
+def strip(items, fields, sizes=None):
+    """
+    Drop fields from a list of statuses (or whatever else) and return
+    it. Fields can be paths such as "account.source", and lists along
+    the way are handled, e.g. "media_attachments.meta". If sizes is
+    given, count the bytes dropped for every field.
+    """
+    for field in fields:
+        path = field.split(".")
+        for item in items:
+            drop(item, path, field, sizes)
+    return items
+
+def drop(value, path, field, sizes):
+    if isinstance(value, list):
+        for item in value:
+            drop(item, path, field, sizes)
+    elif isinstance(value, dict):
+        if len(path) > 1:
+            drop(value.get(path[0]), path[1:], field, sizes)
+        elif path[0] in value:
+            removed = value.pop(path[0])
+            if sizes is not None:
+                # the key, the quotes, the colon and the comma
+                size = len(path[0]) + 4 + len(json.dumps(
+                    removed, separators=(',', ':'), default=core.date_handler))
+                count, total = sizes.get(field, (0, 0))
+                sizes[field] = (count + 1, total + size)
+
+def slim(args):
+    """
+    Drop fields nobody needs from the archive and its split archives
+    """
+
+    confirmed = args.confirmed
+    fields = FIELDS + (args.drop or [])
+
+    if not confirmed:
+
+        print("This is a dry run and nothing will be dropped.\n"
+              "Instead, we'll just list what would have happened.\n"
+              "Use --confirmed to actually do it.")
+
+    (username, domain) = core.parse(args.user)
+
+    status_file = domain + '.user.' + username + '.json'
+
+    for file_name in [status_file] + core.split_archives(status_file):
+        data = core.load(file_name, required=True, quiet=args.quiet)
+
+        sizes = {}
+        for name in list(data.keys()):
+            value = data[name]
+            strip(value if isinstance(value, list) else [value], fields, sizes)
+
+        for field in fields:
+            count, total = sizes.get(field, (0, 0))
+            print("%s: %d times, %d bytes" % (field, count, total))
+
+        if confirmed and sizes:
+
+            if not args.quiet:
+                print("Saving", file_name)
+            core.save(file_name, data, quiet=args.quiet)
+
+        elif confirmed:
+
+            if not args.quiet:
+                print("Nothing to drop from", file_name)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026  Alex Schroeder <alex@gnu.org>
+
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+# Parsing a big archive takes a long time. With --cache, the parsed
+# archive is kept in a snapshot next to it:
+#
+# example.org.user.alex.json
+# example.org.user.alex.json.snapshot
+#
+# The snapshot uses marshal since archives only contain the types JSON
+# has and marshal reads these faster than anything else. Its first line
+# lists the modification time, size and inode of the archive and its
+# journal, and the marshal and Python versions. If any of these differ,
+# the snapshot is not used.
+#
+# Commands reading one collection after another, e.g. text and report,
+# would read the snapshot for every collection. Instead, the data read
+# for them is kept until the archive changes.
+
+import gc
+import json
+import marshal
+import os
+import sys
+from . import codec
+from . import journal
+
+# set by the --cache option
+enabled = False
+
+# the stamp and the data of the shared snapshots read
+_shared = {}
+
+def snapshot_file(file_name):
+    return file_name + ".snapshot"
+
+def stamp(file_name):
+    """
+    Return what the snapshot of an archive depends on.
+    """
+    result = [marshal.version, list(sys.version_info[:2])]
+    for path in (codec.resolve(file_name), journal.journal_file(file_name)):
+        if os.path.isfile(path):
+            st = os.stat(path)
+            result.append([path, st.st_mtime_ns, st.st_size, st.st_ino])
+        else:
+            result.append([path])
+    return result
+
+def read(file_name, shared=False):
+    """
+    Return the data in the snapshot of an archive, or None if there is
+    no up-to-date snapshot. If shared is True, the data is kept and
+    returned again as long as the archive doesn't change, so don't
+    change it.
+    """
+    if not enabled or not os.path.isfile(snapshot_file(file_name)):
+        return None
+    current = stamp(file_name)
+    if shared and file_name in _shared and _shared[file_name][0] == current:
+        return _shared[file_name][1]
+    with open(snapshot_file(file_name), mode='rb') as fp:
+        try:
+            if json.loads(fp.readline()) != current:
+                return None
+        except ValueError:
+            return None
+        raw = fp.read()
+    # the garbage collector has nothing to find in fresh data but it
+    # slows loading down a lot
+    enabled_gc = gc.isenabled()
+    gc.disable()
+    try:
+        data = marshal.loads(raw)
+    except (EOFError, ValueError, TypeError):
+        return None
+    finally:
+        if enabled_gc:
+            gc.enable()
+    if shared:
+        _shared[file_name] = (current, data)
+    return data
+
+def write(file_name, data, shared=False):
+    """
+    Write the snapshot of an archive. If shared is True, the data is
+    returned by the next shared read, so don't change it.
+    """
+    if not enabled:
+        return
+    path = snapshot_file(file_name)
+    try:
+        raw = marshal.dumps(data)
+    except ValueError:
+        # something that isn't JSON, e.g. a date
+        return
+    current = stamp(file_name)
+    with open(path + ".tmp", mode='wb') as fp:
+        fp.write(json.dumps(current).encode('utf-8') + b"\n")
+        fp.write(raw)
+    os.replace(path + ".tmp", path)
+    if shared:
+        _shared[file_name] = (current, data)
+
+def remove(file_name):
+    _shared.pop(file_name, None)
+    if os.path.isfile(snapshot_file(file_name)):
+        os.remove(snapshot_file(file_name))
@@ -14,10 +14,10 @@
 # this program. If not, see <http://www.gnu.org/licenses/>.
 
 import sys
-import os.path
 import math
 from datetime import timedelta, datetime
 from . import core
+from . import codec
 
 def split(args):
     """
@@ -37,12 +37,15 @@ def split(args):
     status_file = domain + '.user.' + username + '.json'
     data = core.load(status_file, required = True, quiet = args.quiet)
     older_data = {}
+    # split archives are normalized like the archive
+    if "normalized" in data:
+        older_data["normalized"] = data["normalized"]
 
     n = 0
     older_status_file = ''
     while True:
         older_status_file = domain + '.user.' + username + '.' + str(n) + '.json'
-        if os.path.exists(older_status_file):
+        if codec.exists(older_status_file):
             n = n + 1
         else:
             break
@@ -81,7 +84,9 @@ def split(args):
         core.save(status_file, data, quiet=args.quiet)
         if not args.quiet:
             print("Saving " + older_status_file)
-        core.save(older_status_file, older_data, quiet=args.quiet)
+        # split archives use the same codec as the archive
+        core.save(older_status_file, older_data, quiet=args.quiet,
+                  codec_name=codec.archive_codec(status_file))
 
     elif confirmed:
 
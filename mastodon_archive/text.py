@@ -36,7 +36,6 @@ def text(args):
 
     media_dir = domain + '.user.' + username
     status_file = domain + '.user.' + username + '.json'
-    data = core.load(status_file, required=True, quiet=True, combine=combine)
 
     def matches(status):
         if status["reblog"] is not None:
@@ -55,21 +54,23 @@ def text(args):
         return True
 
     if collection == "all":
-        statuses = []
         # a lenient collection of all the status types we might have
-        for collection in ["statuses", "favourites", "bookmarks", "mentions"]:
-            if collection in data:
-                statuses += data[collection]
+        statuses = itertools.chain.from_iterable(
+            core.iter_collection(status_file, collection, combine=combine)
+            for collection in ["statuses", "favourites", "bookmarks", "mentions"])
     else:
+        statuses = core.iter_collection(status_file, collection, combine=combine)
         # if a specific collection is requested, not having it in the archive is fatal
-        if collection not in data or len(data[collection]) == 0:
+        first = next(statuses, None)
+        if first is None:
             print("Sadly, {} are missing in your archive".format(collection),
                   file=sys.stderr)
             sys.exit(5)
-        statuses = data[collection]
+        statuses = itertools.chain([first], statuses)
 
+    # Only the matching statuses are kept in memory.
     if len(patterns) > 0:
-        statuses = list(filter(matches, statuses))
+        statuses = filter(matches, statuses)
 
     statuses = sorted(statuses, reverse=reverse, key=lambda status: status["created_at"])
 
@@ -26,7 +26,14 @@ setup(
     },
     install_requires=[
         "mastodon.py",
+        "requests",
         "progress",
         "html2text",
     ],
+    extras_require={
+        "fast": ["orjson"],
+        "zstd": ["zstandard"],
+        "msgpack": ["msgpack"],
+        "async": ["aiohttp"],
+    },
 )
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026  Alex Schroeder <alex@gnu.org>
+
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+import tempfile
+import unittest
+from mastodon_archive import checkpoint
+
+class Page(list):
+    _pagination_next = None
+    _pagination_prev = None
+
+class FakeMastodon:
+    """
+    Return the page after the one with the given max_id.
+    """
+    def __init__(self, pages):
+        self.pages = pages
+
+    def fetch_next(self, following):
+        return self.pages[following["max_id"]]
+
+def page(ids, next_max_id=None):
+    result = Page({"id": id} for id in ids)
+    if next_max_id:
+        result._pagination_next = {"max_id": next_max_id}
+    return result
+
+class TestResume(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.directory.name, "example.org.user.alex.json")
+        self.path = checkpoint.checkpoint_file(self.file_name, "statuses")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_resume_after_incomplete_line(self):
+        # a checkpoint with ids 1 and 2, and a line cut off while writing
+        with open(self.path, mode='w', encoding='utf-8') as fp:
+            fp.write(json.dumps({"items": [{"id": "1"}, {"id": "2"}],
+                                 "next": {"max_id": "2"},
+                                 "cursor": {"min_id": "1"}}) + "\n")
+            fp.write('{"items": [{"id": "3"}, {"i')
+        mastodon = FakeMastodon({"2": page(["3"], "3"), "3": page(["4"])})
+        items, cursor = checkpoint.fetch_remaining(
+            self.file_name, "statuses", mastodon, None, [], quiet=True)
+        self.assertEqual([item["id"] for item in items], ["1", "2", "3", "4"])
+        self.assertEqual(cursor, {"min_id": "1"})
+        # the checkpoint is whole again
+        self.assertEqual(len(list(checkpoint.pages(self.file_name, "statuses"))), 3)
+
+    def test_lost_items_fail(self):
+        path = self.path
+        class LosingMastodon(FakeMastodon):
+            def fetch_next(self, following):
+                # the pages written so far get lost
+                with open(path, mode='r+b') as fp:
+                    fp.truncate(0)
+                return super().fetch_next(following)
+        mastodon = LosingMastodon({"1": page(["2"])})
+        with self.assertRaises(ValueError):
+            checkpoint.fetch_remaining(self.file_name, "statuses", mastodon,
+                                       lambda: page(["1"], "1"), [], quiet=True)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026  Alex Schroeder <alex@gnu.org>
+
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+import sys
+import types
+import unittest
+from mastodon import Mastodon
+from mastodon_archive import core, engine, replies, slim
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmark"))
+import fake_mastodon
+
+def dump(items):
+    """
+    Return the items as they would be stored in the archive.
+    """
+    return json.dumps(slim.strip([dict(item) for item in items], slim.FIELDS),
+                      default=core.date_handler, sort_keys=True)
+
+@unittest.skipIf(engine.aiohttp is None, "the async engine needs aiohttp")
+class TestEngines(unittest.TestCase):
+    """
+    Mastodon.py and the async engine must return the same, so that an
+    archive can be continued with or without --async.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = fake_mastodon.start(fake_mastodon.Instance(200, limit=100000))
+        cls.mastodon = Mastodon(access_token="token", api_base_url=cls.server.url,
+                                version_check_mode="none")
+        cls.engine = engine.Engine(cls.server.url, "token")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.engine.close()
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_same_statuses(self):
+        page = self.mastodon.account_statuses(1, limit=40)
+        other = self.engine.account_statuses(1, limit=40)
+        self.assertEqual(dump(page), dump(other))
+        self.assertIsInstance(other[0]["id"], int)
+        self.assertEqual(page[0]["created_at"], other[0]["created_at"])
+
+    def test_same_pagination(self):
+        page = self.mastodon.notifications(exclude_types=["follow"], limit=80)
+        other = self.engine.notifications(exclude_types=["follow"], limit=80)
+        self.assertEqual(page._pagination_next, other._pagination_next)
+        self.assertEqual(page._pagination_prev, other._pagination_prev)
+
+    def test_resume_with_the_other(self):
+        page = self.mastodon.favourites()
+        other = self.engine.favourites()
+        # checkpoints keep the pagination information as JSON
+        following = json.loads(json.dumps(other._pagination_next))
+        self.assertEqual(dump(self.mastodon.fetch_next(following)),
+                         dump(self.engine.fetch_next(page._pagination_next)))
+
+    def test_replies_found(self):
+        statuses = self.mastodon.fetch_remaining(
+            self.mastodon.account_statuses(1, limit=40))
+        data = {"statuses": statuses}
+        args = types.SimpleNamespace(quiet=True)
+        missing = replies.find_missing(data, args)
+        self.assertTrue(missing)
+        fetched = self.engine.fetch_statuses(missing)
+        data["replies"] = [status for status in fetched if status is not None]
+        # the ones that are gone are still missing, and nothing else
+        gone = [id for id, status in zip(missing, fetched) if status is None]
+        self.assertTrue(len(gone) < len(missing))
+        self.assertEqual(replies.find_missing(data, args), gone)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# Copyright (C) 2026  Alex Schroeder <alex@gnu.org>
+
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+
+import copy
+import json
+import os
+import tempfile
+import unittest
+from mastodon_archive import codec, core, journal, normalize
+
+def account(id):
+    return {"id": str(id), "username": "user%d" % id, "acct": "user%d" % id,
+            "note": "<p>Account %d</p>" % id}
+
+def status(id, account_id=1, **kwargs):
+    result = {"id": str(id), "created_at": "2024-01-%02dT12:00:00+00:00" % id,
+              "content": "<p>Status %d, with ünïcödé</p>" % id,
+              "account": account(account_id), "reblog": None,
+              "in_reply_to_id": None}
+    result.update(kwargs)
+    return result
+
+def sample():
+    """
+    Return an archive with statuses latest first, a boost, and the same
+    statuses in several collections.
+    """
+    boosted = status(2, account_id=7)
+    return {
+        "account": account(1),
+        "statuses": [status(9), status(8, reblog=boosted), status(5),
+                     status(3, in_reply_to_id="2")],
+        "favourites": [boosted, status(4, account_id=8)],
+        "bookmarks": [status(4, account_id=8)],
+        "mentions": [],
+        "followers": [account(7)],
+        "following": [account(7), account(8)],
+        "mutes": [],
+        "blocks": [],
+        "notes": [],
+    }
+
+def plain(data):
+    return {name: data[name] for name in data}
+
+class StorageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.directory.name,
+                                      "example.org.user.alex.json")
+        self.compact_ratio = journal.compact_ratio
+
+    def tearDown(self):
+        journal.compact_ratio = self.compact_ratio
+        self.directory.cleanup()
+
+    def assertLoads(self, data):
+        """
+        Assert that loading and iterating the archive returns the data.
+        """
+        self.assertEqual(plain(core.load(self.file_name, quiet=True)), data)
+        for name in ("statuses", "favourites", "bookmarks"):
+            self.assertEqual(list(core.iter_collection(self.file_name, name)),
+                             data[name])
+
+class TestCodecs(StorageTest):
+
+    def test_round_trip(self):
+        for name in codec.CODECS:
+            if name in codec.MODULES and codec.MODULES[name][1]() is None:
+                continue
+            with self.subTest(codec=name):
+                data = sample()
+                core.save(self.file_name, data, quiet=True, backup=False,
+                          layout="json", codec_name=name)
+                self.assertEqual(codec.archive_codec(self.file_name), name)
+                self.assertEqual(core.archive_layout(self.file_name), "json")
+                self.assertLoads(sample())
+
+    def test_same_bytes_without_orjson(self):
+        data = sample()
+        for pretty in (True, False):
+            with self.subTest(pretty=pretty):
+                raw = codec.json_dumps(data, core.date_handler, pretty)
+                orjson = codec.orjson
+                codec.orjson = None
+                try:
+                    self.assertEqual(
+                        codec.json_dumps(data, core.date_handler, pretty), raw)
+                finally:
+                    codec.orjson = orjson
+
+class TestJournal(StorageTest):
+
+    def change(self, data, changes):
+        """
+        Add a status and update another one, as the archive command does.
+        """
+        new = status(10)
+        data["statuses"].insert(0, new)
+        changes.added("statuses", new)
+        old = data["statuses"][3]
+        old["content"] = "<p>Edited</p>"
+        changes.updated("statuses", old)
+        data["favourites"] = [status(6)]
+        changes.replaced("favourites")
+
+    def test_apply(self):
+        core.save(self.file_name, sample(), quiet=True, backup=False)
+        data = core.load(self.file_name, quiet=True)
+        changes = journal.Changes()
+        self.change(data, changes)
+        core.save(self.file_name, data, quiet=True, backup=False, changes=changes)
+        self.assertTrue(journal.size(self.file_name) > 0)
+        expected = sample()
+        self.change(expected, journal.Changes())
+        self.assertLoads(expected)
+
+    def test_compact(self):
+        core.save(self.file_name, sample(), quiet=True, backup=False)
+        data = core.load(self.file_name, quiet=True)
+        changes = journal.Changes()
+        self.change(data, changes)
+        core.save(self.file_name, data, quiet=True, backup=False, changes=changes)
+        # the journal is too big for the next save
+        journal.compact_ratio = 0
+        data = core.load(self.file_name, quiet=True)
+        data["mutes"] = [account(9)]
+        changes.replaced("mutes")
+        core.save(self.file_name, data, quiet=True, backup=False, changes=changes)
+        self.assertEqual(journal.size(self.file_name), 0)
+        expected = sample()
+        self.change(expected, journal.Changes())
+        expected["mutes"] = [account(9)]
+        self.assertLoads(expected)
+
+class TestNormalize(StorageTest):
+
+    def test_round_trip(self):
+        for modes in (["accounts"], ["statuses"], ["accounts", "statuses"]):
+            with self.subTest(modes=modes):
+                data = sample()
+                data["normalized"] = modes
+                compacted = normalize.compact(copy.deepcopy(data))
+                # every account and every status is stored once
+                if "accounts" in modes:
+                    self.assertEqual(sorted(compacted["accounts"]), ["1", "7", "8"])
+                if "statuses" in modes:
+                    self.assertEqual(sorted(compacted["status_table"]),
+                                     ["2", "3", "4", "5", "8", "9"])
+                self.assertEqual(normalize.expand(json.loads(json.dumps(compacted))),
+                                 data)
+
+    def test_save_and_load(self):
+        data = sample()
+        data["normalized"] = ["accounts", "statuses"]
+        core.save(self.file_name, data, quiet=True, backup=False)
+        self.assertLoads(data)
+
+class TestLayouts(StorageTest):
+
+    def test_round_trip(self):
+        for layout in ("folder", "sqlite"):
+            with self.subTest(layout=layout):
+                self.file_name = os.path.join(self.directory.name,
+                                              "%s.user.alex.json" % layout)
+                core.save(self.file_name, sample(), quiet=True, backup=False,
+                          layout=layout)
+                self.assertEqual(core.archive_layout(self.file_name), layout)
+                self.assertLoads(sample())
+                # change a collection and save again
+                data = core.load(self.file_name, quiet=True)
+                data["bookmarks"] = [status(6)]
+                core.save(self.file_name, data, quiet=True, backup=False)
+                expected = sample()
+                expected["bookmarks"] = [status(6)]
+                self.assertLoads(expected)
+
+class TestCombine(StorageTest):
+
+    def test_merge(self):
+        data = sample()
+        split = {"statuses": [status(7), status(1)],
+                 "favourites": [status(6), status(4, account_id=8)],
+                 "bookmarks": [], "mentions": []}
+        core.save(self.file_name, data, quiet=True, backup=False)
+        core.save(self.file_name.replace(".json", ".0.json"), split,
+                  quiet=True, backup=False)
+        combined = core.load(self.file_name, quiet=True, combine=True)
+        # statuses by date, the rest in the order they were stored
+        self.assertEqual([s["id"] for s in combined["statuses"]],
+                         ["9", "8", "7", "5", "3", "1"])
+        self.assertEqual([s["id"] for s in combined["favourites"]],
+                         ["2", "4", "6"])
+        for name in ("statuses", "favourites"):
+            self.assertEqual(list(core.iter_collection(self.file_name, name,
+                                                       combine=True)),
+                             combined[name])
+
+if __name__ == '__main__':
+    unittest.main()